@@ -0,0 +1,351 @@
+"""
+Benchmark harness for the IMAZER handlers.
+
+Each stage runs over the synthetic corpus from benchmarks/corpus.py in a
+fresh interpreter, so import costs and peak RSS of one stage never leak into
+the next. Per stage it reports throughput (MB/s and files/s), latency
+percentiles per call and peak RSS.
+
+    python -m benchmarks.bench --save-baseline bench_baseline.json
+    python -m benchmarks.bench --baseline bench_baseline.json
+
+With --baseline, any stage whose throughput, p90 latency or peak RSS is worse
+than the stored run by more than --tolerance is reported and the process exits
+with status 1. Baselines are only comparable on the same machine.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from queue import Empty
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.corpus import SEED, generate_corpus, resolve_manifest
+
+DEFAULT_CORPUS = "bench_corpus"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.20
+# Peak RSS growth below this many MB is treated as noise
+RSS_SLACK_MB = 8
+# A stage gets this long for its whole run before it is killed
+STAGE_TIMEOUT = 1800
+
+
+def _load_hashes():
+    from handlers.hashing import calculate_forensic_hashes
+    return calculate_forensic_hashes
+
+
+def _load_entropy():
+    from handlers.hashing import calculate_entropy
+
+    def entropy(path):
+        with open(path, "rb") as f:
+            return calculate_entropy(f.read())
+    return entropy
+
+
+def _load_audio():
+    from handlers.audio_handler import extract_audio_metadata
+    return extract_audio_metadata
+
+
+def _load_image_metadata():
+    from handlers.image_handler import extract_image_metadata
+    return extract_image_metadata
+
+
+def _load_image_tamper():
+    from handlers.image_forensics import analyze_tampering
+    return analyze_tampering
+
+
+def _load_pdf():
+    from handlers.pdf_handler import PDF_Handler
+
+    def pdf(path):
+        handler = PDF_Handler(path)
+        handler.analyze()
+        return handler.results()
+    return pdf
+
+
+def _load_pdf_structure():
+    from handlers.pdf_structure import scan_pdf_structure
+    return scan_pdf_structure
+
+
+def _load_video():
+    from handlers.video_handler import probe_video
+    return probe_video
+
+
+def _load_analyze():
+    from handlers.analyze import analyze_file
+
+    def analyze(path):
+        return analyze_file(path, budget=False)
+    return analyze
+
+
+# name -> (corpus kinds the stage runs on, None for every file; loader)
+STAGES = {
+    "hashes": (None, _load_hashes),
+    "entropy": (None, _load_entropy),
+    "audio": (("audio",), _load_audio),
+    "image_metadata": (("image",), _load_image_metadata),
+    "image_tamper": (("image",), _load_image_tamper),
+    "pdf": (("pdf",), _load_pdf),
+    "pdf_structure": (("pdf",), _load_pdf_structure),
+    "video": (("video",), _load_video),
+    "analyze": (None, _load_analyze),
+}
+
+
+def _peak_rss_mb():
+    # VmHWM belongs to this address space; ru_maxrss survives fork and exec,
+    # so a spawned worker would report the parent's peak as its own
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of an unsorted list."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _stage_worker(name, files, repeat, queue):
+    try:
+        func = STAGES[name][1]()
+    except ImportError as e:
+        queue.put({"status": "skipped", "reason": str(e)})
+        return
+    rss_loaded = _peak_rss_mb()
+
+    latencies = []
+    errors = []
+    total_bytes = 0
+    for entry in files:
+        path = entry["path"]
+        try:
+            # One untimed call warms the page cache and any lazy imports
+            result = func(path)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = func(path)
+                latencies.append(time.perf_counter() - start)
+                total_bytes += entry["size"]
+        except Exception as e:
+            errors.append(f"{os.path.basename(path)}: {str(e)}")
+            continue
+        if isinstance(result, dict) and result.get("error"):
+            errors.append(f"{os.path.basename(path)}: {result['error']}")
+
+    if not latencies:
+        queue.put({"status": "failed", "errors": errors})
+        return
+    seconds = sum(latencies)
+    queue.put({
+        "status": "ok",
+        "files": len(files),
+        "calls": len(latencies),
+        "bytes": total_bytes,
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(total_bytes / (1024 * 1024) / seconds, 3),
+        "files_per_s": round(len(latencies) / seconds, 3),
+        "latency_ms": {
+            key: round(percentile(latencies, fraction) * 1000, 3)
+            for key, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        },
+        "rss_after_import_mb": rss_loaded,
+        "peak_rss_mb": _peak_rss_mb(),
+        "errors": errors,
+    })
+
+
+def run_stage(name, files, repeat=DEFAULT_REPEAT, timeout=STAGE_TIMEOUT):
+    """Run one stage in a fresh interpreter and return its measurements."""
+    kinds = STAGES[name][0]
+    selected = [entry for entry in files if kinds is None or entry["kind"] in kinds]
+    if not selected:
+        return {"status": "skipped", "reason": "no corpus files for this stage"}
+
+    # spawn, not fork: every stage starts from a clean interpreter
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_stage_worker, args=(name, selected, repeat, queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                result = {"status": "failed", "errors": [f"worker died with status {process.exitcode}"]}
+            elif time.monotonic() > deadline:
+                process.kill()
+                result = {"status": "failed", "errors": [f"stage did not finish within {timeout} seconds"]}
+    process.join()
+    if process.exitcode not in (0, None) and result.get("status") == "ok":
+        result["errors"].append(f"worker exited with status {process.exitcode}")
+    return result
+
+
+def load_corpus(directory, seed=SEED):
+    """Reuse a corpus generated with the same seed, or generate it."""
+    manifest_path = os.path.join(directory, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        files = resolve_manifest(directory, manifest["files"])
+        if manifest.get("seed") == seed and all(os.path.getsize(entry["path"]) == entry["size"] for entry in files):
+            return files, manifest.get("skipped", [])
+    except (OSError, ValueError, KeyError):
+        pass
+    return generate_corpus(directory, seed)
+
+
+def run_benchmarks(corpus_dir=DEFAULT_CORPUS, stages=None, repeat=DEFAULT_REPEAT, seed=SEED, progress=None):
+    files, corpus_skipped = load_corpus(corpus_dir, seed)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "corpus": {
+            "seed": seed,
+            "files": len(files),
+            "bytes": sum(entry["size"] for entry in files),
+            "skipped": corpus_skipped,
+        },
+        "repeat": repeat,
+        "stages": {},
+    }
+    for name in stages or STAGES:
+        if progress:
+            progress(name)
+        report["stages"][name] = run_stage(name, files, repeat)
+    return report
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare a report to a baseline. Returns (regressions, notes): regressions
+    fail the run, notes are printed but do not.
+    """
+    regressions = []
+    notes = []
+    if report["environment"] != baseline.get("environment"):
+        notes.append("environment differs from the baseline; numbers may not be comparable")
+    if report["corpus"]["seed"] != baseline.get("corpus", {}).get("seed"):
+        notes.append("corpus seed differs from the baseline")
+
+    for name, base in baseline.get("stages", {}).items():
+        current = report["stages"].get(name)
+        if current is None or base.get("status") != "ok":
+            continue
+        if current["status"] == "skipped":
+            notes.append(f"{name}: measured in the baseline but skipped now ({current['reason']})")
+            continue
+        if current["status"] != "ok":
+            regressions.append(f"{name}: stage failed: {'; '.join(current['errors'])}")
+            continue
+        if current["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['mb_per_s']} MB/s, baseline {base['mb_per_s']} MB/s"
+            )
+        if current["latency_ms"]["p90"] > base["latency_ms"]["p90"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p90 latency {current['latency_ms']['p90']} ms, baseline {base['latency_ms']['p90']} ms"
+            )
+        if current["peak_rss_mb"] is not None and base.get("peak_rss_mb") is not None and \
+                current["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance) + RSS_SLACK_MB:
+            regressions.append(
+                f"{name}: peak RSS {current['peak_rss_mb']} MB, baseline {base['peak_rss_mb']} MB"
+            )
+    return regressions, notes
+
+
+def print_report(report):
+    corpus = report["corpus"]
+    print(f"Corpus: {corpus['files']} files, {corpus['bytes'] / (1024 * 1024):.1f} MB (seed {corpus['seed']})")
+    for reason in corpus["skipped"]:
+        print(f"  not generated: {reason}")
+    print(f"\n{'stage':<16}{'MB/s':>10}{'files/s':>10}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'RSS MB':>9}")
+    for name, stage in report["stages"].items():
+        if stage["status"] == "skipped":
+            print(f"{name:<16}skipped: {stage['reason']}")
+        elif stage["status"] == "failed":
+            print(f"{name:<16}FAILED: {'; '.join(stage['errors'])}")
+        else:
+            latency = stage["latency_ms"]
+            print(f"{name:<16}{stage['mb_per_s']:>10.2f}{stage['files_per_s']:>10.2f}"
+                  f"{latency['p50']:>11.2f}{latency['p90']:>11.2f}{latency['p99']:>11.2f}"
+                  f"{stage['peak_rss_mb'] or 0:>9.1f}")
+            for error in stage["errors"]:
+                print(f"{'':<16}error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IMAZER handlers on a synthetic corpus")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="corpus directory (generated if missing)")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), help="stages to run (default all)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed calls per file")
+    parser.add_argument("--seed", type=int, default=SEED, help="corpus seed")
+    parser.add_argument("--output", help="write the full report as JSON")
+    parser.add_argument("--baseline", help="compare against this stored report")
+    parser.add_argument("--save-baseline", help="store this run as a baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown / growth before a regression (default 0.20)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.corpus, args.stages, args.repeat, args.seed,
+                            progress=lambda name: print(f"Running {name}...", file=sys.stderr))
+    print_report(report)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions, notes = compare(report, baseline, args.tolerance)
+        for note in notes:
+            print(f"Note: {note}")
+        if regressions:
+            print(f"\nREGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
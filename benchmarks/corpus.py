@@ -0,0 +1,228 @@
+"""
+Reproducible synthetic corpus for the benchmarks, generated offline.
+
+Every file is derived from a fixed seed. WAVs and PDFs are byte-identical
+for a given seed on any machine; JPEGs are deterministic for a given NumPy,
+Pillow and libjpeg build, videos for a given ffmpeg build. The manifest
+records paths relative to the corpus directory, so a corpus can be moved or
+shared and still reused.
+"""
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import wave
+
+SEED = 1337
+# Seconds of 44.1 kHz 16-bit stereo audio per WAV (about 176 KB per second)
+WAV_SECONDS = (1, 10, 60)
+# (width, height) of the generated JPEGs
+JPEG_SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+# Number of pages per generated PDF
+PDF_PAGES = (1, 20, 200)
+VIDEO_SECONDS = (2, 10)
+
+FIXED_DATETIME = "2023:06:15 14:30:00"
+FIXED_PDF_DATE = "D:20230615143000+02'00'"
+COORDINATES = [
+    (40.7128, "N", 74.0060, "W"),
+    (51.5074, "N", 0.1278, "W"),
+    (35.6762, "N", 139.6503, "E"),
+    (33.8688, "S", 151.2093, "E"),
+]
+
+
+def generate_wav(path, seconds, rng):
+    frames = 44100 * seconds
+    with wave.open(path, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(44100)
+        # A tone plus seeded noise, written one second at a time
+        for second in range(seconds):
+            samples = []
+            for i in range(44100):
+                t = (second * 44100 + i) / 44100
+                value = int(8000 * ((t * 440) % 1 - 0.5) + rng.randint(-500, 500))
+                samples.append(value)
+                samples.append(-value)
+            out.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+    return frames
+
+
+def _xmp_segment():
+    packet = (
+        '<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description xmlns:xmp="http://ns.adobe.com/xap/1.0/" '
+        'xmp:CreateDate="2023-06-15T14:30:00+02:00" xmp:CreatorTool="IMAZER benchmark corpus"/>'
+        '</rdf:RDF></x:xmpmeta><?xpacket end="w"?>'
+    ).encode("utf-8")
+    payload = b"http://ns.adobe.com/xap/1.0/\x00" + packet
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def generate_jpeg(path, size, rng, index):
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    noise = np.random.default_rng(rng.randint(0, 2 ** 32 - 1))
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(pixels + noise.normal(0, 6, pixels.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+
+    lat, lat_ref, lon, lon_ref = COORDINATES[index % len(COORDINATES)]
+    exif = img.getexif()
+    exif[0x010F] = "IMAZER"          # Make
+    exif[0x0110] = "Synthetic"       # Model
+    exif[0x0132] = FIXED_DATETIME    # DateTime
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x9003] = FIXED_DATETIME  # DateTimeOriginal
+    gps = exif.get_ifd(0x8825)
+    gps[1] = lat_ref
+    gps[2] = _to_dms(lat)
+    gps[3] = lon_ref
+    gps[4] = _to_dms(lon)
+
+    img.save(path, "JPEG", quality=90, exif=exif)
+    with open(path, "rb") as f:
+        data = f.read()
+    # Insert the XMP APP1 segment right after SOI
+    with open(path, "wb") as f:
+        f.write(data[:2] + _xmp_segment() + data[2:])
+
+
+def _to_dms(value):
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round(((value - degrees) * 60 - minutes) * 60, 2)
+    return (float(degrees), float(minutes), seconds)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def generate_pdf(path, pages, rng):
+    """A minimal PDF with an Info dictionary and coordinate-laden text on every page."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_obj = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for page in range(pages):
+        lines = []
+        for line in range(40):
+            lat, lat_ref, lon, lon_ref = COORDINATES[rng.randrange(len(COORDINATES))]
+            lines.append(
+                f"Site {page}-{line}: {lat + rng.random():.4f} {lat_ref}, {lon + rng.random():.4f} {lon_ref} "
+                f"contact ops{line}@example.com table {rng.randint(1, 99)}"
+            )
+        content = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({_pdf_escape(text)}) '" for text in lines) + " ET"
+        stream = content.encode("latin-1")
+        contents = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_obj, contents, font)
+        ))
+    info = add(
+        f"<< /Title (Synthetic report) /Author (IMAZER) /Producer (IMAZER benchmark corpus) "
+        f"/CreationDate ({FIXED_PDF_DATE}) /ModDate ({FIXED_PDF_DATE}) >>".encode("latin-1")
+    )
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode("ascii")
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, info, xref
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_video(path, seconds):
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"testsrc=duration={seconds}:size=640x360:rate=25",
+         "-metadata", "creation_time=2023-06-15T12:30:00Z",
+         "-pix_fmt", "yuv420p", path],
+        check=True, timeout=120
+    )
+
+
+def generate_corpus(directory, seed=SEED):
+    """
+    Write the corpus into directory and return its manifest, a list of
+    {"path", "kind", "size"} entries with paths under directory. JPEGs are skipped without Pillow and
+    NumPy, and videos without ffmpeg on PATH.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = []
+    skipped = []
+
+    def record(path, kind):
+        manifest.append({"path": os.path.basename(path), "kind": kind, "size": os.path.getsize(path)})
+
+    for seconds in WAV_SECONDS:
+        path = os.path.join(directory, f"tone_{seconds}s.wav")
+        generate_wav(path, seconds, rng)
+        record(path, "audio")
+
+    try:
+        for index, size in enumerate(JPEG_SIZES):
+            path = os.path.join(directory, f"photo_{size[0]}x{size[1]}.jpg")
+            generate_jpeg(path, size, rng, index)
+            record(path, "image")
+    except ImportError as e:
+        skipped.append(f"image: {str(e)}")
+
+    for pages in PDF_PAGES:
+        path = os.path.join(directory, f"report_{pages}p.pdf")
+        generate_pdf(path, pages, rng)
+        record(path, "pdf")
+
+    if shutil.which("ffmpeg"):
+        for seconds in VIDEO_SECONDS:
+            path = os.path.join(directory, f"testsrc_{seconds}s.mp4")
+            generate_video(path, seconds)
+            record(path, "video")
+    else:
+        skipped.append("video: ffmpeg not found on PATH")
+
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "files": manifest, "skipped": skipped}, f, indent=2)
+    return resolve_manifest(directory, manifest), skipped
+
+
+def resolve_manifest(directory, entries):
+    """Manifest entries with their paths joined to the corpus directory."""
+    return [{**entry, "path": os.path.join(directory, entry["path"])} for entry in entries]
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "bench_corpus"
+    files, missing = generate_corpus(target)
+    print(f"Wrote {len(files)} files to {target}")
+    for reason in missing:
+        print(f"Skipped {reason}")
@@ -0,0 +1,181 @@
+import os
+from functools import partial
+
+from handlers import metrics
+from handlers.budget import report_partial, run_with_budget
+from handlers.hashing import calculate_forensic_hashes
+from handlers.image_handler import SUPPORTED_EXTENSIONS as IMAGE_EXTENSIONS
+from handlers.timeline import extract_events
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".aac", ".ogg", ".m4a", ".aiff", ".wma")
+PDF_EXTENSIONS = (".pdf",)
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".flv")
+
+
+def detect_kind(file_path):
+    """Pick the handler for a file from its extension, None if unsupported."""
+    ext = os.path.splitext(file_path)[1].lower()
+    for kind, extensions in (
+        ("audio", AUDIO_EXTENSIONS),
+        ("image", IMAGE_EXTENSIONS),
+        ("pdf", PDF_EXTENSIONS),
+        ("video", VIDEO_EXTENSIONS),
+    ):
+        if ext in extensions:
+            return kind
+    return None
+
+
+# Handler modules are imported inside the analyzers so a batch of PDFs never
+# pays for pymediainfo or ffmpeg imports, matching the menu in main.py.
+# The audio handler reports hashes itself (computed by _analyze() when given);
+# _analyze() adds them to the other results when it hashed the file.
+def analyze_audio(file_path, hashes=None, stat=None):
+    from handlers.audio_handler import extract_audio_metadata
+    return extract_audio_metadata(file_path, on_section=report_partial, hashes=hashes, stat=stat)
+
+
+def analyze_image(file_path):
+    from handlers.image_handler import extract_image_metadata
+    from handlers.image_forensics import analyze_tampering
+    result = extract_image_metadata(file_path)
+    if "error" not in result:
+        report_partial("exif", result["exif"])
+        try:
+            result["tamper_analysis"] = analyze_tampering(file_path)
+        except Exception as e:
+            result["tamper_analysis"] = {"error": f"Tamper analysis failed: {str(e)}"}
+    return result
+
+
+def analyze_pdf(file_path, triage=False):
+    """
+    Structural byte scan first; with triage set, only documents it flags go
+    on to the full pdfminer analysis.
+    """
+    from handlers.pdf_structure import scan_pdf_structure
+    try:
+        with metrics.span("pdf.structure"):
+            structure = scan_pdf_structure(file_path)
+    except (OSError, ValueError) as e:
+        structure = {"error": f"Structural scan failed: {str(e)}"}
+    report_partial("structure", structure)
+    if triage and not structure.get("needs_full_analysis", True):
+        metrics.count("files_triaged_out", kind="pdf")
+        return {
+            "file_path": os.path.abspath(file_path),
+            "structure": structure,
+            "skipped": "No structural flags, full analysis not run"
+        }
+    from handlers.pdf_handler import PDF_Handler
+    handler = PDF_Handler(file_path)
+    handler.analyze(on_section=report_partial)
+    return {**handler.results(), "structure": structure}
+
+
+def analyze_video(file_path):
+    from handlers.video_handler import probe_video
+    return probe_video(file_path)
+
+
+ANALYZERS = {
+    "audio": analyze_audio,
+    "image": analyze_image,
+    "pdf": analyze_pdf,
+    "video": analyze_video,
+}
+
+
+def needs_hashes(kind, known_indexes=(), fuzzy=None, hash_all=False):
+    """
+    Whether _analyze() runs the full hash pass for a file. Audio always had
+    its hash block; the other handlers only pay for a whole-file read when
+    something uses the digests.
+    """
+    return kind == "audio" or bool(known_indexes) or bool(fuzzy) or hash_all
+
+
+def _analyze(kind, file_path, known_indexes=(), skip_known=False, pdf_triage=False, fuzzy=None,
+             hash_all=False):
+    """
+    Hash the file in one pass (see needs_hashes()), check it against the
+    known-hash indexes and only then run the handler. Known-good files are returned with just their
+    hashes and verdict when skip_known is set, unflagged PDFs with just their
+    structural scan when pdf_triage is set. Every timestamp the handler found
+    is normalized into result["timeline"] (see handlers.timeline).
+    """
+    with metrics.profile(file_path):
+        # Before the first read, so access times are the file's, not ours
+        stat = os.stat(file_path)
+        hashes = None
+        if needs_hashes(kind, known_indexes, fuzzy, hash_all):
+            hashes = calculate_forensic_hashes(file_path, fuzzy=fuzzy)
+            report_partial("hashes", hashes)
+        verdict = None
+        if known_indexes:
+            from handlers.known_hashes import known_file_verdict
+            with metrics.span("known_hashes"):
+                verdict = known_file_verdict(hashes, known_indexes)
+            report_partial("known_file", verdict)
+            if skip_known and verdict["status"] == "known":
+                metrics.count("files_skipped_known", kind=kind)
+                return {
+                    "file_path": os.path.abspath(file_path),
+                    "hashes": hashes,
+                    "known_file": verdict,
+                    "skipped": "Known file, handler not run"
+                }
+        with metrics.span(kind):
+            if kind == "pdf":
+                result = analyze_pdf(file_path, triage=pdf_triage)
+            elif kind == "audio":
+                result = analyze_audio(file_path, hashes, stat=stat)
+            else:
+                result = ANALYZERS[kind](file_path)
+        if hashes is not None and kind != "audio":
+            result["hashes"] = hashes
+        with metrics.span("timeline"):
+            result["timeline"] = extract_events(file_path, kind, result, stat=stat)
+    if verdict is not None:
+        result["known_file"] = verdict
+    return result
+
+
+def analyze_file(file_path, kind=None, budget=True, slow_lane=False,
+                 known_indexes=(), skip_known=False, pdf_triage=False, fuzzy=None, hash_all=False,
+                 mp_context=None, **overrides):
+    """
+    Analyze one file with the handler matching its type.
+
+    With budget=True the handler runs in a killable worker under the limits
+    from handlers.budget; overrides (timeout, max_memory_mb,
+    max_file_size_mb) replace the per-handler defaults. known_indexes are
+    paths of handlers.known_hashes indexes that give every file a
+    known_file verdict. pdf_triage skips the pdfminer analysis for PDFs the
+    structural scan (handlers.pdf_structure) does not flag. fuzzy is passed
+    to calculate_forensic_hashes(); hash_all hashes image, PDF and video
+    files even when no index needs the digests. mp_context is the
+    multiprocessing context budget workers are started with.
+    """
+    kind = kind or detect_kind(file_path)
+    if kind not in ANALYZERS:
+        return {"error": f"Unsupported file type: {os.path.splitext(file_path)[1] or file_path}"}
+    if not os.path.isfile(file_path):
+        return {"error": "File not found"}
+    func = partial(_analyze, kind, known_indexes=tuple(known_indexes), skip_known=skip_known,
+                   pdf_triage=pdf_triage, fuzzy=fuzzy, hash_all=hash_all)
+    # Counted here rather than in the worker, whose metrics die with it
+    # when it is killed
+    metrics.count("files", kind=kind)
+    if not budget:
+        return func(file_path)
+    if known_indexes:
+        # Map the indexes before forking so every worker shares the same pages.
+        # Workers from a forkserver (mp_context in the daemon) are not forked
+        # from this process; the forkserver maps them itself.
+        from handlers.known_hashes import load_index
+        for path in known_indexes:
+            load_index(path)
+    with metrics.span(f"budget.{kind}"):
+        return run_with_budget(func, file_path, kind, slow_lane=slow_lane, mp_context=mp_context,
+                               hashing=needs_hashes(kind, known_indexes, fuzzy, hash_all), **overrides)
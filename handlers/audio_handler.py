@@ -1,13 +1,15 @@
-import hashlib
 import json
 import os
 import binascii
-import math
 import sys
 from datetime import datetime
 from pymediainfo import MediaInfo
+from handlers import metrics
+from handlers.hashing import calculate_entropy, calculate_forensic_hashes
 
-def extract_audio_metadata(file_path):
+def extract_audio_metadata(file_path, on_section=None, hashes=None, stat=None):
+    # stat is taken by the caller before it read the file (hashes), so the
+    # recorded access time is not our own
     if not os.path.isfile(file_path):
         return {"error": "File not found"}
 
@@ -28,7 +30,7 @@ def extract_audio_metadata(file_path):
     }
 
     try:
-        stat = os.stat(file_path)
+        stat = stat or os.stat(file_path)
         metadata["file_info"] = {
             "file_path": os.path.abspath(file_path),
             "file_name": os.path.basename(file_path),
@@ -46,9 +48,13 @@ def extract_audio_metadata(file_path):
             "flags": get_file_flags(file_path)
         }
 
-        metadata["hashes"] = calculate_forensic_hashes(file_path)
+        metadata["hashes"] = hashes or calculate_forensic_hashes(file_path)
+        if on_section:
+            on_section("file_info", metadata["file_info"])
+            on_section("hashes", metadata["hashes"])
 
-        media_info = MediaInfo.parse(file_path)
+        with metrics.span("audio.mediainfo"):
+            media_info = MediaInfo.parse(file_path)
 
         for track in media_info.tracks:
             track_data = {}
@@ -75,55 +81,24 @@ def extract_audio_metadata(file_path):
             elif track.track_type == "Other":
                 metadata["embedded_metadata"].append(track_data)
 
-        metadata["signatures"] = file_signature_analysis(file_path)
-        metadata["forensic_analysis"].update({
-            "header_analysis": analyze_file_header(file_path),
-            "trailer_analysis": analyze_file_trailer(file_path),
-            "steganography_indicators": detect_steganography_indicators(file_path),
-            "anomalies": detect_forensic_anomalies(metadata, file_path)
-        })
+        if on_section:
+            for section in ("technical_metadata", "audio_tracks", "chapters", "embedded_metadata"):
+                on_section(section, metadata[section])
+
+        with metrics.span("audio.forensics"):
+            metadata["signatures"] = file_signature_analysis(file_path)
+            metadata["forensic_analysis"].update({
+                "header_analysis": analyze_file_header(file_path),
+                "trailer_analysis": analyze_file_trailer(file_path),
+                "steganography_indicators": detect_steganography_indicators(file_path),
+                "anomalies": detect_forensic_anomalies(metadata, file_path)
+            })
 
         return metadata
 
     except Exception as e:
         return {"error": f"Forensic analysis failed: {str(e)}"}
 
-def calculate_forensic_hashes(file_path):
-    hashers = {
-        "md5": hashlib.md5(),
-        "sha1": hashlib.sha1(),
-        "sha256": hashlib.sha256(),
-        "sha512": hashlib.sha512(),
-        "sha3_256": hashlib.sha3_256(),
-        "blake2b": hashlib.blake2b()
-    }
-
-    head_hashers = {f"head_1k_{algo}": hashlib.new(algo) for algo in ['md5', 'sha1', 'sha256']}
-    tail_hashers = {f"tail_1k_{algo}": hashlib.new(algo) for algo in ['md5', 'sha1', 'sha256']}
-
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as f:
-        head_data = f.read(1024)
-        for h in head_hashers.values():
-            h.update(head_data)
-
-        f.seek(0)
-        while chunk := f.read(8192):
-            for h in hashers.values():
-                h.update(chunk)
-
-        if file_size > 1024:
-            f.seek(-1024, os.SEEK_END)
-            tail_data = f.read(1024)
-            for h in tail_hashers.values():
-                h.update(tail_data)
-
-    return {
-        **{algo: h.hexdigest() for algo, h in hashers.items()},
-        **{algo: h.hexdigest() for algo, h in head_hashers.items()},
-        **{algo: h.hexdigest() for algo, h in tail_hashers.items()}
-    }
-
 def file_signature_analysis(file_path):
     ext = os.path.splitext(file_path)[1].lower()
     with open(file_path, "rb") as f:
@@ -224,16 +199,6 @@ def detect_forensic_anomalies(metadata, file_path):
 
     return anomalies
 
-def calculate_entropy(data):
-    if not data:
-        return 0.0
-    entropy = 0.0
-    for x in range(256):
-        p_x = float(data.count(x)) / len(data)
-        if p_x > 0:
-            entropy += - p_x * math.log2(p_x)
-    return entropy
-
 def identify_known_signatures(data):
     signatures = {
         "ID3": [(b'ID3', "ID3v2 tag")],
@@ -337,7 +302,7 @@ audio_handler = extract_audio_metadata
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
-        print("Usage: python audio_forensics.py <audio_file>")
+        print("Usage: python -m handlers.audio_handler <audio_file>")
         sys.exit(1)
 
     result = extract_audio_metadata(sys.argv[1])
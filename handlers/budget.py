@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import queue
+import time
+from datetime import datetime, timezone
+
+from handlers import metrics
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits, only the wall-clock budget applies
+    resource = None
+
+# Per-handler limits. timeout is wall-clock seconds for the whole analysis,
+# max_memory_mb caps the worker's address space and max_file_size_mb rejects
+# files before any parser touches them. None disables a limit.
+HANDLER_BUDGETS = {
+    "audio": {"timeout": 60, "max_memory_mb": 2048, "max_file_size_mb": 4096},
+    # Tamper analysis holds the decoded image (300 MB at 100 MP) plus per-thread tiles
+    "image": {"timeout": 30, "max_memory_mb": 4096, "max_file_size_mb": 1024},
+    "pdf": {"timeout": 60, "max_memory_mb": 2048, "max_file_size_mb": 1024},
+    "video": {"timeout": 60, "max_memory_mb": 2048, "max_file_size_mb": None},
+}
+
+# Added to the timeout per GB of file when the worker runs the full hash pass
+# first (six digests, about 16 s/GB measured), so hashing alone never uses
+# up the handler's budget
+HASH_SECONDS_PER_GB = 30
+
+# Quarantined files are retried in the slow lane with every limit multiplied
+SLOW_LANE_MULTIPLIER = 10
+QUARANTINE_FILE = "imazer_quarantine.ndjson"
+
+# Seconds to wait for a worker to exit after its result or terminate()
+# before killing it
+KILL_GRACE = 1.0
+
+BUDGET_ERROR_MESSAGES = {
+    "timeout": "Analysis timed out after {limit_s}s",
+    "oversize": "File exceeds the {limit_mb} MB size budget",
+    "memory": "Analysis exceeded the {limit_mb} MB memory budget",
+    "crash": "Analysis worker died (exit code {exit_code})",
+    "exception": "Analysis failed: {message}"
+}
+
+_partial_queue = None
+
+
+def get_budget(kind, slow_lane=False, **overrides):
+    budget = dict(HANDLER_BUDGETS.get(kind, {"timeout": 60, "max_memory_mb": None, "max_file_size_mb": None}))
+    budget.update({key: value for key, value in overrides.items() if value is not None})
+    if slow_lane:
+        budget = {key: value * SLOW_LANE_MULTIPLIER if value else value for key, value in budget.items()}
+    return budget
+
+
+def report_partial(section, value):
+    """Hand a finished result section to the parent while the worker keeps going."""
+    if _partial_queue is None:
+        return
+    try:
+        _partial_queue.put(("partial", section, value))
+    except Exception:
+        pass
+
+
+def _limit_memory(max_memory_mb):
+    if not max_memory_mb or resource is None:
+        return
+    limit = int(max_memory_mb * 1024 * 1024)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker(func, args, max_memory_mb, result_queue, metrics_config=None):
+    global _partial_queue
+    _partial_queue = result_queue
+    metrics.start_worker(metrics_config)
+    _limit_memory(max_memory_mb)
+    try:
+        message = ("done", func(*args))
+    except MemoryError:
+        message = ("error", {"type": "memory", "limit_mb": max_memory_mb})
+    except Exception as e:
+        message = ("error", {"type": "exception", "message": str(e)})
+    if metrics_config is not None:
+        # Sent first: the parent stops reading once the result arrives
+        result_queue.put(("metrics", metrics.drain()))
+    result_queue.put(message)
+
+
+def _stop(process):
+    process.terminate()
+    process.join(KILL_GRACE)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def quarantine(file_path, kind, budget_error, quarantine_file=QUARANTINE_FILE):
+    """Record a file that blew its budget so it can be retried in the slow lane."""
+    record = {
+        "file_path": os.path.abspath(file_path),
+        "kind": kind,
+        "budget_error": budget_error,
+        "quarantined_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    }
+    with open(quarantine_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def read_quarantine(quarantine_file=QUARANTINE_FILE):
+    """Return (file_path, kind) pairs recorded by quarantine()."""
+    if not os.path.isfile(quarantine_file):
+        return []
+    entries = []
+    seen = set()
+    with open(quarantine_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record["file_path"] not in seen:
+                seen.add(record["file_path"])
+                entries.append((record["file_path"], record.get("kind")))
+    return entries
+
+
+def release_quarantine(file_paths, quarantine_file=QUARANTINE_FILE):
+    """Rewrite the quarantine file without the records of file_paths."""
+    released = {os.path.abspath(path) for path in file_paths}
+    if not released or not os.path.isfile(quarantine_file):
+        return
+    with open(quarantine_file, encoding="utf-8") as f:
+        lines = f.readlines()
+    kept = []
+    for line in lines:
+        try:
+            if json.loads(line)["file_path"] in released:
+                continue
+        except (ValueError, KeyError, TypeError):
+            pass
+        kept.append(line)
+    temp_path = f"{quarantine_file}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.writelines(kept)
+    os.replace(temp_path, quarantine_file)
+
+
+def run_with_budget(func, file_path, kind, slow_lane=False, quarantine_file=QUARANTINE_FILE,
+                    mp_context=None, hashing=False, **overrides):
+    """
+    Run func(file_path) in a killable worker process under the budget of `kind`.
+
+    The worker is started with mp_context (a multiprocessing context), or
+    the platform default. Multithreaded callers should not fork directly,
+    see handlers.daemon.worker_context(). With hashing set, func hashes the
+    whole file first and the timeout grows by HASH_SECONDS_PER_GB.
+
+    Sections sent through report_partial() are kept, so a worker that is
+    killed still returns everything it finished. Budget failures add an
+    "error" message and a structured "budget_error" record to the result
+    and the file is quarantined (unless it is already in the slow lane).
+    """
+    budget = get_budget(kind, slow_lane, **overrides)
+    start = time.monotonic()
+    partial = {}
+    budget_error = None
+
+    max_size = budget.get("max_file_size_mb")
+    size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+    if max_size and size > max_size * 1024 * 1024:
+        budget_error = {"type": "oversize", "file_size": size, "limit_mb": max_size}
+    else:
+        context = mp_context or multiprocessing
+        result_queue = context.Queue()
+        process = context.Process(
+            target=_worker,
+            args=(func, (file_path,), budget.get("max_memory_mb"), result_queue, metrics.worker_config()),
+            daemon=True
+        )
+        process.start()
+        timeout = budget.get("timeout")
+        if timeout and hashing:
+            timeout = round(timeout + size / (1024 ** 3) * HASH_SECONDS_PER_GB, 3)
+        deadline = start + timeout if timeout else None
+        with metrics.subprocess_wait("budget_worker"):
+            while True:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    budget_error = {"type": "timeout", "limit_s": timeout}
+                    break
+                try:
+                    message = result_queue.get(timeout=min(wait, 0.5) if wait is not None else 0.5)
+                except queue.Empty:
+                    if not process.is_alive() and result_queue.empty():
+                        budget_error = {"type": "crash", "exit_code": process.exitcode}
+                        break
+                    continue
+                if message[0] == "partial":
+                    partial[message[1]] = message[2]
+                elif message[0] == "metrics":
+                    metrics.merge(message[1])
+                elif message[0] == "done":
+                    # The worker exits right after sending; one stuck in
+                    # teardown (a non-daemon thread, an atexit hook) is killed
+                    process.join(KILL_GRACE)
+                    if process.is_alive():
+                        _stop(process)
+                    result_queue.close()
+                    return message[1]
+                else:
+                    budget_error = message[1]
+                    break
+        _stop(process)
+        result_queue.close()
+
+    metrics.count("budget_errors", type=budget_error["type"], kind=kind)
+    budget_error["elapsed_s"] = round(time.monotonic() - start, 3)
+    budget_error["slow_lane"] = slow_lane
+    if budget_error["type"] != "exception" and not slow_lane:
+        quarantine(file_path, kind, budget_error, quarantine_file)
+        budget_error["quarantined"] = True
+
+    return {
+        **partial,
+        "error": BUDGET_ERROR_MESSAGES[budget_error["type"]].format(**budget_error),
+        "budget_error": budget_error,
+        "partial": bool(partial)
+    }
@@ -0,0 +1,353 @@
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from handlers import metrics
+from handlers.analyze import ANALYZERS, analyze_file, detect_kind
+from handlers.output import encode_record
+
+DEFAULT_SOCKET = "/tmp/imazer.sock"
+# Used instead of a Unix socket where AF_UNIX is unavailable (older Windows).
+# Loopback only: the protocol has no authentication, any local user can
+# submit jobs and read the results.
+DEFAULT_TCP_ADDRESS = ("127.0.0.1", 8765)
+DEFAULT_WORKERS = os.cpu_count() or 4
+RESULT_CACHE_SIZE = 1024
+WARM_MODULES = ("handlers.audio_handler", "handlers.image_handler",
+                "handlers.pdf_handler", "handlers.video_handler", "PIL.Image")
+
+
+def warm_up():
+    """Import every handler and its heavy dependencies once, up front."""
+    warmed = []
+    for module in WARM_MODULES:
+        try:
+            __import__(module)
+            warmed.append(module)
+        except ImportError:
+            pass
+    return warmed
+
+
+def worker_context(known_indexes=()):
+    """
+    Multiprocessing context for budget workers started from daemon threads.
+
+    Forking a multithreaded process copies locks other threads may hold
+    (the metrics registry, logging, imports) and can deadlock the child.
+    Workers are forked from a single-threaded forkserver instead, started
+    now with the handlers preloaded and known_indexes mapped, so each fork
+    starts warm and shares the index pages. Platforms without forkserver
+    use spawn, which does not fork at all.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    from multiprocessing import forkserver
+    from handlers.known_hashes import INDEXES_ENV
+    context = multiprocessing.get_context("forkserver")
+    preload = ["handlers.analyze", *WARM_MODULES]
+    if known_indexes:
+        # The forkserver inherits the environment and working directory when
+        # it starts below; paths stay as given, they key load_index()'s cache
+        os.environ[INDEXES_ENV] = os.pathsep.join(known_indexes)
+        preload.append("handlers.index_preload")
+    context.set_forkserver_preload(preload)
+    forkserver.ensure_running()
+    return context
+
+
+class ResultCache:
+    """LRU of finished results keyed on (path, size, mtime), so resubmits are free."""
+
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path, options):
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, options)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, key, result):
+        if not self.size:
+            return
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class AnalysisService:
+    """Warm handlers, a bounded worker pool and the counters behind {"cmd": "stats"}."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, budget=True, cache_size=RESULT_CACHE_SIZE,
+                 known_indexes=(), skip_known=False, pdf_triage=False, hash_all=False):
+        self.warmed = warm_up()
+        self.known_indexes = tuple(known_indexes)
+        self.skip_known = skip_known
+        self.pdf_triage = pdf_triage
+        self.hash_all = hash_all
+        if self.known_indexes:
+            # Fails at startup on a bad index; budget workers get theirs
+            # from the forkserver (worker_context())
+            from handlers.known_hashes import load_index
+            for path in self.known_indexes:
+                load_index(path)
+        self.mp_context = worker_context(self.known_indexes) if budget else None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imazer")
+        self.workers = workers
+        self.budget = budget
+        self.cache = ResultCache(cache_size)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.busy_seconds = 0.0
+        self.exiftool_sessions = []
+
+    def _exiftool(self):
+        session = getattr(self.local, "exiftool", None)
+        if session is None:
+            from handlers.image_handler import ExifToolSession
+            session = self.local.exiftool = ExifToolSession()
+            with self.lock:
+                self.exiftool_sessions.append(session)
+        return session
+
+    def _run(self, job, on_done):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        start = time.monotonic()
+        path = job.get("path")
+        kind = job.get("kind") or (detect_kind(path) if path else None)
+        try:
+            options = (kind, bool(job.get("exiftool")))
+            key = ResultCache.key(path, options) if path and os.path.isfile(path) else None
+            result = self.cache.get(key) if key else None
+            if result is not None:
+                with self.lock:
+                    self.cache_hits += 1
+                metrics.count("cache_hits")
+            else:
+                result = analyze_file(
+                    path, kind=kind, budget=self.budget, timeout=job.get("timeout"),
+                    known_indexes=self.known_indexes, skip_known=self.skip_known,
+                    pdf_triage=self.pdf_triage, hash_all=self.hash_all, mp_context=self.mp_context
+                )
+                if kind == "image" and job.get("exiftool") and "error" not in result:
+                    from handlers.image_handler import extract_all_metadata
+                    result["exiftool"] = extract_all_metadata(path, session=self._exiftool())
+                if key and "error" not in result:
+                    self.cache.put(key, result)
+        except Exception as e:
+            result = {"error": f"Analysis failed: {str(e)}"}
+        elapsed = time.monotonic() - start
+        with self.lock:
+            self.running -= 1
+            self.completed += 1
+            self.busy_seconds += elapsed
+            if "error" in result:
+                self.failed += 1
+            queued, running = self.queued, self.running
+        if metrics.enabled():
+            metrics.observe("stage", "daemon.job", elapsed)
+            metrics.gauge("daemon_queue_depth", queued)
+            metrics.gauge("daemon_running", running)
+            metrics.gauge("daemon_workers", self.workers)
+            metrics.export(force=False)
+        record = {"file": path, "kind": kind, "elapsed_s": round(elapsed, 4), "result": result}
+        if "id" in job:
+            record["id"] = job["id"]
+        if on_done:
+            on_done(record)
+        return record
+
+    def submit(self, job, on_done=None):
+        """Queue a job; on_done(record) runs on the worker before the future resolves."""
+        with self.lock:
+            self.queued += 1
+        return self.executor.submit(self._run, job, on_done)
+
+    def stats(self):
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            return {
+                "uptime_s": round(uptime, 3),
+                "workers": self.workers,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cache_hits": self.cache_hits,
+                "files_per_s": round(self.completed / uptime, 3) if uptime else 0.0,
+                "mean_latency_s": round(self.busy_seconds / self.completed, 4) if self.completed else 0.0,
+                "handlers": sorted(ANALYZERS),
+                "warmed_modules": self.warmed,
+                **({"metrics": metrics.summary()} if metrics.enabled() else {})
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        for session in self.exiftool_sessions:
+            session.close()
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON object per line in, one NDJSON record per finished job out.
+
+    {"path": "...", "kind": "pdf", "id": 7, "exiftool": true, "timeout": 10}
+    {"cmd": "stats"}
+    Records are written as jobs finish, not in submission order.
+    """
+
+    def handle(self):
+        service = self.server.service
+        write_lock = threading.Lock()
+        pending = []
+
+        def send(record):
+            line = encode_record(record)
+            with write_lock:
+                try:
+                    self.wfile.write(line)
+                    self.wfile.flush()
+                except OSError:
+                    pass
+
+        for raw in self.rfile:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                job = json.loads(raw)
+            except ValueError as e:
+                send({"error": f"Invalid job: {str(e)}"})
+                continue
+            if not isinstance(job, dict):
+                send({"error": "Invalid job: expected an object"})
+                continue
+            if job.get("cmd") == "stats":
+                send({"stats": service.stats()})
+                continue
+            pending.append(service.submit(job, on_done=send))
+
+        for future in pending:
+            future.result()
+
+
+def resolve_address(address=None):
+    """The socket path to use, or DEFAULT_TCP_ADDRESS where AF_UNIX is unavailable."""
+    if isinstance(address, tuple):
+        return address
+    if not hasattr(socket, "AF_UNIX"):
+        return DEFAULT_TCP_ADDRESS
+    return address or DEFAULT_SOCKET
+
+
+def _remove_stale_socket(path):
+    """
+    Unlink a socket left behind by a daemon that did not shut down. Anything
+    else at path, or a socket a live daemon still answers on, is left alone.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"A daemon is already listening on {path}")
+
+
+def serve(address=None, workers=DEFAULT_WORKERS, budget=True, known_indexes=(), skip_known=False,
+          pdf_triage=False, hash_all=False):
+    """
+    Run the analysis daemon until interrupted. Where AF_UNIX is unavailable
+    it listens on DEFAULT_TCP_ADDRESS, which is unauthenticated, so only
+    use it on single-user machines. Raises OSError if address is taken.
+    """
+    address = resolve_address(address)
+    if not isinstance(address, tuple):
+        _remove_stale_socket(address)
+    service = AnalysisService(workers=workers, budget=budget, known_indexes=known_indexes,
+                              skip_known=skip_known, pdf_triage=pdf_triage, hash_all=hash_all)
+    if isinstance(address, tuple):
+        server = socketserver.ThreadingTCPServer(address, _JobHandler)
+    else:
+        server = socketserver.ThreadingUnixStreamServer(address, _JobHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"IMAZER daemon listening on {address} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        metrics.export()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+
+def _connect(address):
+    address = resolve_address(address)
+    if isinstance(address, tuple):
+        return socket.create_connection(address)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(address)
+    return client
+
+
+def submit_files(paths, address=DEFAULT_SOCKET, **options):
+    """
+    Send paths to a running daemon and yield result records as they finish.
+    Paths are made absolute, the daemon resolves relative ones against its
+    own working directory.
+    """
+    with _connect(address) as client:
+        jobs = "".join(
+            json.dumps({"path": os.path.abspath(path), "id": i, **options}) + "\n" for i, path in enumerate(paths)
+        )
+        client.sendall(jobs.encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                yield json.loads(line)
+
+
+def daemon_stats(address=DEFAULT_SOCKET):
+    with _connect(address) as client:
+        client.sendall(b'{"cmd": "stats"}\n')
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("r", encoding="utf-8") as replies:
+            return json.loads(replies.readline())["stats"]
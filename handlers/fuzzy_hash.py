@@ -0,0 +1,411 @@
+"""
+Context-triggered piecewise hashing (ssdeep-compatible) and a similarity index.
+
+Digests are byte-for-byte compatible with ssdeep, so they can be compared
+against hashes produced by other forensic tools. The `ssdeep` extension is
+used when installed (NATIVE). The pure-Python fallback is about 80x slower.
+It only runs when a fuzzy hash is explicitly asked for, and only for files up
+to PURE_PYTHON_MAX_BYTES.
+"""
+import re
+import sqlite3
+
+try:
+    import ssdeep
+except ImportError:
+    ssdeep = None
+
+# Fuzzy hashing is free enough to run on every file only with the C extension
+NATIVE = ssdeep is not None
+
+ROLLING_WINDOW = 7
+MIN_BLOCKSIZE = 3
+SPAMSUM_LENGTH = 64
+NUM_BLOCKHASHES = 31
+HASH_PRIME = 0x01000193
+HASH_INIT = 0x28021967
+B64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+B64_INDEX = {char: i for i, char in enumerate(B64)}
+
+PURE_PYTHON_MAX_BYTES = 8 * 1024 * 1024
+# Marks FuzzyIndex keys of whole signatures too short for a 7-gram
+SHORT_KEY = 1 << 48
+
+# Only the low 6 bits of the FNV piece hash reach the digest, and those only
+# depend on the low 6 bits of the previous state, so a 64x256 table suffices.
+_SUM_TABLE = [[((h * HASH_PRIME) ^ c) & 63 for c in range(256)] for h in range(64)]
+_SEQUENCES = re.compile(r"(.)\1{3,}")
+
+
+class _PurePythonHasher:
+    """
+    Port of ssdeep's streaming engine (fuzzy.c). One piece hash is kept per
+    block size 3 * 2**i; larger block sizes are forked on their first trigger
+    and the smallest is dropped once it can no longer be selected. Knowing the
+    total size up front lets sizes that can never reach the digest be skipped.
+    """
+
+    def __init__(self, total_size):
+        self.total_size = total_size
+        guess = 0
+        while (MIN_BLOCKSIZE << guess) * SPAMSUM_LENGTH < total_size and guess < NUM_BLOCKHASHES - 2:
+            guess += 1
+        # The digest uses the selected size and the one above it, never more
+        self.bhendlimit = guess + 2
+        self.bhstart = 0
+        self.bhend = 1
+        self.h = [HASH_INIT & 63] * NUM_BLOCKHASHES
+        self.halfh = [HASH_INIT & 63] * NUM_BLOCKHASHES
+        self.digest = [[] for _ in range(NUM_BLOCKHASHES)]
+        self.halfdigest = [None] * NUM_BLOCKHASHES
+        # Character in the slot after a full digest, digest[dlen] in fuzzy.c
+        self.overflow = [None] * NUM_BLOCKHASHES
+        self.window = [0] * ROLLING_WINDOW
+        self.roll = [0, 0, 0, 0]  # h1, h2, h3, window position
+
+    def _reduce(self):
+        if self.bhend - self.bhstart < 2:
+            return
+        if (MIN_BLOCKSIZE << self.bhstart) * SPAMSUM_LENGTH >= self.total_size:
+            return
+        if len(self.digest[self.bhstart + 1]) < SPAMSUM_LENGTH // 2:
+            return
+        self.bhstart += 1
+
+    def update(self, data):
+        h1, h2, h3, n = self.roll
+        window = self.window
+        h = self.h
+        halfh = self.halfh
+        digest = self.digest
+        table = _SUM_TABLE
+        mask = 0xFFFFFFFF
+        half = SPAMSUM_LENGTH // 2
+        # halfh only diverges from h once a digest holds half its length, until
+        # then it is kept in sync at trigger time instead of updated per byte
+        active = range(self.bhstart, self.bhend)
+        diverged = [i for i in active if len(digest[i]) >= half]
+        smallest = MIN_BLOCKSIZE << self.bhstart
+
+        for c in data:
+            h2 = (h2 - h1 + ROLLING_WINDOW * c) & mask
+            h1 = (h1 + c - window[n]) & mask
+            window[n] = c
+            n += 1
+            if n == ROLLING_WINDOW:
+                n = 0
+            h3 = ((h3 << 5) & mask) ^ c
+            rolling = (h1 + h2 + h3) & mask
+
+            for i in active:
+                h[i] = table[h[i]][c]
+            for i in diverged:
+                halfh[i] = table[halfh[i]][c]
+
+            if rolling % smallest != smallest - 1:
+                continue
+
+            i = self.bhstart
+            while i < self.bhend:
+                block_size = MIN_BLOCKSIZE << i
+                if rolling % block_size != block_size - 1:
+                    break
+                if len(digest[i]) < half:
+                    halfh[i] = h[i]
+                if not digest[i] and self.bhend < self.bhendlimit:
+                    last = self.bhend - 1
+                    h[last + 1] = h[last]
+                    self.bhend += 1
+                if len(digest[i]) < SPAMSUM_LENGTH - 1:
+                    digest[i].append(B64[h[i]])
+                    self.overflow[i] = None
+                    self.halfdigest[i] = B64[halfh[i]]
+                    h[i] = HASH_INIT & 63
+                    if len(digest[i]) < half:
+                        halfh[i] = HASH_INIT & 63
+                        self.halfdigest[i] = None
+                else:
+                    self.overflow[i] = B64[h[i]]
+                    self.halfdigest[i] = B64[halfh[i]]
+                    self._reduce()
+                i += 1
+
+            active = range(self.bhstart, self.bhend)
+            diverged = [i for i in active if len(digest[i]) >= half]
+            smallest = MIN_BLOCKSIZE << self.bhstart
+
+        self.roll = [h1, h2, h3, n]
+
+    def hexdigest(self):
+        h1, h2, h3, _ = self.roll
+        rolling = (h1 + h2 + h3) & 0xFFFFFFFF
+        bi = self.bhstart
+        while (MIN_BLOCKSIZE << bi) * SPAMSUM_LENGTH < self.total_size:
+            bi += 1
+        while bi >= self.bhend:
+            bi -= 1
+        while bi > self.bhstart and len(self.digest[bi]) < SPAMSUM_LENGTH // 2:
+            bi -= 1
+
+        first = "".join(self.digest[bi])
+        if rolling != 0:
+            first += B64[self.h[bi]]
+        elif self.overflow[bi]:
+            first += self.overflow[bi]
+
+        second = ""
+        if bi < self.bhend - 1:
+            second = "".join(self.digest[bi + 1][:SPAMSUM_LENGTH // 2 - 1])
+            if rolling != 0:
+                halfh = self.halfh if len(self.digest[bi + 1]) >= SPAMSUM_LENGTH // 2 else self.h
+                second += B64[halfh[bi + 1]]
+            elif self.halfdigest[bi + 1]:
+                second += self.halfdigest[bi + 1]
+        elif rolling != 0 and bi == 0:
+            second = B64[self.h[bi]]
+
+        return f"{MIN_BLOCKSIZE << bi}:{first}:{second}"
+
+
+class FuzzyHasher:
+    """hashlib-style streaming fuzzy hasher; total_size must be known up front."""
+
+    def __init__(self, total_size):
+        self.total_size = total_size
+        if ssdeep is not None:
+            self._hasher = ssdeep.Hash()
+        elif total_size <= PURE_PYTHON_MAX_BYTES:
+            self._hasher = _PurePythonHasher(total_size)
+        else:
+            self._hasher = None
+
+    @property
+    def available(self):
+        return self._hasher is not None
+
+    def update(self, data):
+        if self._hasher is not None:
+            self._hasher.update(data)
+
+    def hexdigest(self):
+        if self._hasher is None:
+            return None
+        return self._hasher.digest() if ssdeep is not None else self._hasher.hexdigest()
+
+
+def fuzzy_hash(data):
+    hasher = FuzzyHasher(len(data))
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def parse_digest(digest):
+    block_size, first, second = digest.split(":", 2)
+    return int(block_size), first, second
+
+
+def eliminate_sequences(signature):
+    """Collapse runs of more than three identical characters, as ssdeep does."""
+    return _SEQUENCES.sub(lambda m: m.group(1) * 3, signature)
+
+
+def _has_common_substring(first, second):
+    grams = {first[i:i + ROLLING_WINDOW] for i in range(len(first) - ROLLING_WINDOW + 1)}
+    return any(second[i:i + ROLLING_WINDOW] in grams for i in range(len(second) - ROLLING_WINDOW + 1))
+
+
+def _edit_distance(first, second):
+    # Insert and remove cost 1, replace costs 2, as in ssdeep's edit_dist.c
+    previous = list(range(len(second) + 1))
+    for i, a in enumerate(first, 1):
+        current = [i]
+        for j, b in enumerate(second, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (0 if a == b else 2)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def _score_strings(first, second, block_size):
+    if len(first) > SPAMSUM_LENGTH or len(second) > SPAMSUM_LENGTH:
+        return 0
+    if not _has_common_substring(first, second):
+        return 0
+    score = _edit_distance(first, second)
+    score = (score * SPAMSUM_LENGTH) // (len(first) + len(second))
+    score = (100 * score) // SPAMSUM_LENGTH
+    if score >= 100:
+        return 0
+    score = 100 - score
+    # Small block sizes give short, unreliable signatures, so cap their score
+    if block_size >= (99 + ROLLING_WINDOW) // ROLLING_WINDOW * MIN_BLOCKSIZE:
+        return score
+    return min(score, block_size // MIN_BLOCKSIZE * min(len(first), len(second)))
+
+
+def fuzzy_compare(digest1, digest2):
+    """Similarity of two digests from 0 (unrelated) to 100, as `ssdeep -d` reports it."""
+    if ssdeep is not None:
+        return ssdeep.compare(digest1, digest2)
+    bs1, first1, second1 = parse_digest(digest1)
+    bs2, first2, second2 = parse_digest(digest2)
+    if bs1 != bs2 and bs1 != bs2 * 2 and bs2 != bs1 * 2:
+        return 0
+    first1, second1 = eliminate_sequences(first1), eliminate_sequences(second1)
+    first2, second2 = eliminate_sequences(first2), eliminate_sequences(second2)
+    if bs1 == bs2 and first1 == first2:
+        return 100
+    if bs1 == bs2:
+        return max(_score_strings(first1, first2, bs1), _score_strings(second1, second2, bs1 * 2))
+    if bs1 == bs2 * 2:
+        return _score_strings(first1, second2, bs1)
+    return _score_strings(second1, first2, bs2)
+
+
+def _gram_keys(digest):
+    """
+    Integer keys for every 7-character window of a digest.
+
+    ssdeep scores two signatures 0 unless they share a 7-character run at the
+    same block size, so files sharing no key can never match. A key packs the
+    block size exponent above the 42 bits of the seven base64 characters.
+
+    The one exception is identical signatures, which score 100 at any length.
+    A signature shorter than 7 characters (a tiny file) therefore gets one
+    whole-signature key instead, flagged by bit SHORT_KEY, with its length
+    above the packed characters.
+    """
+    block_size, first, second = parse_digest(digest)
+    exponent = (block_size // MIN_BLOCKSIZE).bit_length() - 1
+    keys = set()
+    for level, signature in ((exponent, first), (exponent + 1, second)):
+        signature = eliminate_sequences(signature)
+        if len(signature) < ROLLING_WINDOW:
+            packed = 0
+            for char in signature:
+                packed = (packed << 6) | B64_INDEX[char]
+            keys.add(SHORT_KEY | (level << 42) | (len(signature) << 36) | packed)
+            continue
+        for i in range(len(signature) - ROLLING_WINDOW + 1):
+            gram = 0
+            for char in signature[i:i + ROLLING_WINDOW]:
+                gram = (gram << 6) | B64_INDEX[char]
+            keys.add((level << 42) | gram)
+    return keys
+
+
+class FuzzyIndex:
+    """
+    SQLite-backed 7-gram index over fuzzy digests.
+
+    search() only scores files that share a gram (or, for tiny files, a whole
+    signature, see _gram_keys()) with the query, so a lookup touches a
+    handful of index pages instead of comparing against every digest in the
+    case.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-65536;
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS grams (
+                key INTEGER NOT NULL,
+                file_id INTEGER NOT NULL,
+                PRIMARY KEY (key, file_id)
+            ) WITHOUT ROWID;
+        """)
+        has_unique_paths = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'files_by_path'"
+        ).fetchone()
+        if not has_unique_paths:
+            # Indexes created before paths were unique can hold repeats, keep the newest
+            with self.conn:
+                stale = [
+                    (file_id, digest) for file_id, digest in self.conn.execute(
+                        "SELECT id, digest FROM files WHERE id NOT IN (SELECT MAX(id) FROM files GROUP BY path)"
+                    )
+                ]
+                for file_id, digest in stale:
+                    self._delete(file_id, digest)
+                self.conn.execute("CREATE UNIQUE INDEX files_by_path ON files (path)")
+
+    def add(self, path, digest):
+        self.add_many([(path, digest)])
+
+    def add_many(self, entries, batch_size=50000):
+        """
+        Insert (path, digest) pairs; a path already in the index has its
+        digest and grams replaced. Gram rows are sorted per batch before
+        insertion so the B-tree is filled in order instead of at random pages.
+        """
+        batch = []
+        with self.conn:
+            for path, digest in entries:
+                row = self.conn.execute("SELECT id, digest FROM files WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    file_id = self.conn.execute(
+                        "INSERT INTO files (path, digest) VALUES (?, ?)", (path, digest)
+                    ).lastrowid
+                elif row[1] == digest:
+                    continue
+                else:
+                    file_id = row[0]
+                    # Pending grams may belong to the digest being replaced
+                    self._insert_grams(batch)
+                    batch = []
+                    self._delete(file_id, row[1], keep_file=True)
+                    self.conn.execute("UPDATE files SET digest = ? WHERE id = ?", (digest, file_id))
+                batch.extend((key, file_id) for key in _gram_keys(digest))
+                if len(batch) >= batch_size * 64:
+                    self._insert_grams(batch)
+                    batch = []
+            self._insert_grams(batch)
+
+    def _delete(self, file_id, digest, keep_file=False):
+        # grams is keyed (key, file_id), the old digest gives every key to delete
+        self.conn.executemany(
+            "DELETE FROM grams WHERE key = ? AND file_id = ?", [(key, file_id) for key in _gram_keys(digest)]
+        )
+        if not keep_file:
+            self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _insert_grams(self, rows):
+        rows.sort()
+        self.conn.executemany("INSERT OR IGNORE INTO grams (key, file_id) VALUES (?, ?)", rows)
+
+    def candidates(self, digest):
+        keys = list(_gram_keys(digest))
+        if not keys:
+            return []
+        placeholders = ",".join("?" * len(keys))
+        return self.conn.execute(
+            f"SELECT id, path, digest FROM files WHERE id IN "
+            f"(SELECT DISTINCT file_id FROM grams WHERE key IN ({placeholders}))",
+            keys
+        ).fetchall()
+
+    def search(self, digest, threshold=1, limit=None):
+        """Return [{"path", "digest", "score"}] for indexed files scoring >= threshold."""
+        matches = []
+        for _, path, other in self.candidates(digest):
+            score = fuzzy_compare(digest, other)
+            if score >= threshold:
+                matches.append({"path": path, "digest": other, "score": score})
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return matches[:limit] if limit else matches
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
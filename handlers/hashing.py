@@ -0,0 +1,73 @@
+import hashlib
+import math
+import os
+
+from handlers import metrics
+from handlers.fuzzy_hash import NATIVE, FuzzyHasher
+
+
+def calculate_forensic_hashes(file_path, fuzzy=None):
+    """
+    Cryptographic digests, 1 KiB head/tail digests and an ssdeep fuzzy hash,
+    all from a single streaming read of the file.
+
+    fuzzy=None adds the fuzzy hash only when the ssdeep extension is
+    installed. fuzzy=True also falls back to the slow pure-Python hasher,
+    for callers that need the digest (the similarity index).
+    """
+    if fuzzy is None:
+        fuzzy = NATIVE
+    hashers = {
+        "md5": hashlib.md5(),
+        "sha1": hashlib.sha1(),
+        "sha256": hashlib.sha256(),
+        "sha512": hashlib.sha512(),
+        "sha3_256": hashlib.sha3_256(),
+        "blake2b": hashlib.blake2b()
+    }
+
+    head_hashers = {f"head_1k_{algo}": hashlib.new(algo) for algo in ['md5', 'sha1', 'sha256']}
+    tail_hashers = {f"tail_1k_{algo}": hashlib.new(algo) for algo in ['md5', 'sha1', 'sha256']}
+
+    file_size = os.path.getsize(file_path)
+    fuzzy_hasher = FuzzyHasher(file_size) if fuzzy else None
+    metrics.count("bytes_read", file_size, stage="hashes")
+    with metrics.span("hashes"), open(file_path, "rb") as f:
+        head_data = f.read(1024)
+        for h in head_hashers.values():
+            h.update(head_data)
+
+        f.seek(0)
+        while chunk := f.read(8192):
+            for h in hashers.values():
+                h.update(chunk)
+            if fuzzy_hasher:
+                fuzzy_hasher.update(chunk)
+
+        if file_size > 1024:
+            f.seek(-1024, os.SEEK_END)
+            tail_data = f.read(1024)
+            for h in tail_hashers.values():
+                h.update(tail_data)
+
+    hashes = {
+        **{algo: h.hexdigest() for algo, h in hashers.items()},
+        **{algo: h.hexdigest() for algo, h in head_hashers.items()},
+        **{algo: h.hexdigest() for algo, h in tail_hashers.items()}
+    }
+    if fuzzy_hasher:
+        # None when only the pure-Python fallback exists and the file is too large for it
+        hashes["ssdeep"] = fuzzy_hasher.hexdigest()
+    return hashes
+
+
+def calculate_entropy(data):
+    """Shannon entropy of a byte string in bits per byte (0 to 8)."""
+    if not data:
+        return 0.0
+    entropy = 0.0
+    for x in range(256):
+        p_x = float(data.count(x)) / len(data)
+        if p_x > 0:
+            entropy += - p_x * math.log2(p_x)
+    return entropy
@@ -0,0 +1,148 @@
+"""
+Pixel-level tamper analysis: error level analysis (ELA) and noise residuals.
+
+The image is decoded once by Pillow and then processed in fixed-size tiles
+on a thread pool. Pillow's JPEG codec and filters and NumPy all release the
+GIL, so tiles really run in parallel. ELA has to see the pixels at full
+resolution, so the whole decoded image is held in memory: 3 bytes per pixel
+for RGB (4 for RGBA or CMYK), 300 MB for a 100 MP photo. Other modes are
+converted tile by tile, never as a second full-size copy. On top of that
+each worker needs about 10 MB at the default tile size, and there are at
+most MAX_WORKERS of them.
+
+Each tile gets two scores:
+  ela    mean absolute difference after recompressing the tile as JPEG.
+         Regions pasted from another source recompress differently.
+  noise  variance of the high-pass residual (tile minus its median filter).
+         Spliced regions usually carry a different sensor noise level.
+Tiles whose score is far from the image's own median (robust z-score) are
+reported as suspicious.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from handlers import metrics
+
+TILE_SIZE = 512  # a multiple of 16 keeps tiles aligned to JPEG MCUs
+# Tile threads; budget workers already run one file per core
+MAX_WORKERS = 4
+ELA_QUALITY = 90
+# Robust z-score above which a tile is called suspicious
+Z_THRESHOLD = 3.5
+# Tiles smaller than this (right/bottom edges) are too small to score reliably
+MIN_TILE_SIZE = 32
+# Smallest spread assumed when scoring: ELA in grey levels, noise in log variance
+MIN_ELA_MAD = 0.05
+MIN_NOISE_MAD = 0.05
+# Pixels this close to 0 or 255 are ignored for noise; tiles with less than
+# MIN_UNSATURATED of their pixels left get no noise score
+SATURATION_MARGIN = 4
+MIN_UNSATURATED = 0.25
+
+
+def _tile_scores(img, box, quality):
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    tile = img.crop(box)
+    if tile.mode != "RGB":
+        tile = tile.convert("RGB")
+    buffer = io.BytesIO()
+    tile.save(buffer, "JPEG", quality=quality)
+    buffer.seek(0)
+    with Image.open(buffer) as recompressed:
+        diff = np.abs(
+            np.asarray(tile, dtype=np.int16) - np.asarray(recompressed.convert("RGB"), dtype=np.int16)
+        )
+    ela = float(diff.mean())
+
+    gray = tile.convert("L")
+    pixels = np.asarray(gray, dtype=np.float32)
+    residual = pixels - np.asarray(gray.filter(ImageFilter.MedianFilter(3)), dtype=np.float32)
+    # Clipped shadows and highlights have no visible noise at all
+    unsaturated = (pixels > SATURATION_MARGIN) & (pixels < 255 - SATURATION_MARGIN)
+    if unsaturated.mean() < MIN_UNSATURATED:
+        return ela, None
+    return ela, float(residual[unsaturated].var())
+
+
+def _robust_z(values, min_mad):
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    median = np.median(values)
+    # The floor stops near-identical tiles (flat renders, screenshots) from
+    # turning tiny differences into huge z-scores
+    mad = max(float(np.median(np.abs(values - median))), min_mad)
+    # 1.4826 scales the MAD to a standard deviation for normal data
+    return (values - median) / (1.4826 * mad)
+
+
+def analyze_tampering(image_path, tile_size=TILE_SIZE, quality=ELA_QUALITY, workers=None):
+    """
+    Run ELA and noise-residual analysis over an image in tiles.
+
+    Returns per-tile score grids (rows of tiles, left to right) and a
+    summary whose "score" runs from 0 (uniform) to 1 (strong local outliers).
+    """
+    try:
+        import numpy as np
+        from PIL import Image
+    except ImportError as e:
+        return {"error": f"Tamper analysis unavailable: {str(e)}"}
+
+    with Image.open(image_path) as img:
+        with metrics.span("image.decode"):
+            source_format = img.format
+            img.load()
+        width, height = img.size
+
+        boxes = [
+            (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            for top in range(0, height, tile_size)
+            for left in range(0, width, tile_size)
+        ]
+        cols = (width + tile_size - 1) // tile_size
+        rows = (height + tile_size - 1) // tile_size
+        workers = workers or min(os.cpu_count() or 1, MAX_WORKERS)
+        with metrics.span("image.tamper"), ThreadPoolExecutor(max_workers=workers) as pool:
+            scores = list(pool.map(lambda box: _tile_scores(img, box, quality), boxes))
+
+    ela = np.array([score[0] for score in scores]).reshape(rows, cols)
+    noise = np.array([np.nan if score[1] is None else score[1] for score in scores]).reshape(rows, cols)
+    full = np.array([
+        (box[2] - box[0]) >= MIN_TILE_SIZE and (box[3] - box[1]) >= MIN_TILE_SIZE for box in boxes
+    ]).reshape(rows, cols)
+    has_noise = full & ~np.isnan(noise)
+
+    ela_z = np.zeros_like(ela)
+    noise_z = np.zeros_like(noise)
+    if full.sum() >= 4:
+        ela_z[full] = _robust_z(ela[full], MIN_ELA_MAD)
+    if has_noise.sum() >= 4:
+        # Noise variance spans orders of magnitude between flat sky and foliage
+        noise_z[has_noise] = np.abs(_robust_z(np.log1p(noise[has_noise]), MIN_NOISE_MAD))
+    # Only unusually high error levels point at pasted content
+    suspicious = full & ((ela_z > Z_THRESHOLD) | (noise_z > Z_THRESHOLD))
+    max_z = float(max(ela_z.max(initial=0.0), noise_z.max(initial=0.0)))
+
+    return {
+        "format": source_format,
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "jpeg_quality": quality,
+        "grid": {"rows": rows, "cols": cols},
+        "ela": np.round(ela, 3).tolist(),
+        "noise": [[None if np.isnan(value) else value for value in row] for row in np.round(noise, 3).tolist()],
+        "summary": {
+            "ela_mean": round(float(ela[full].mean()) if full.any() else 0.0, 3),
+            "ela_max": round(float(ela.max()), 3),
+            "noise_median": round(float(np.median(noise[has_noise])) if has_noise.any() else 0.0, 3),
+            "max_ela_z": round(float(ela_z.max(initial=0.0)), 2),
+            "max_noise_z": round(float(noise_z.max(initial=0.0)), 2),
+            "suspicious_tiles": [[int(r), int(c)] for r, c in zip(*np.nonzero(suspicious))],
+            "score": round(min(1.0, max_z / (2 * Z_THRESHOLD)), 3)
+        }
+    }
@@ -1,50 +1,164 @@
-def image_handler():
-    import os
-    import tkinter as tk
-    from tkinter import filedialog
-    from PIL import Image, ExifTags
-    from PIL.ExifTags import GPSTAGS
-    import subprocess
-    import json
+import os
+import queue
+import subprocess
+import json
+import threading
+import time
+
+from handlers import metrics
+
+SUPPORTED_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif",
+    ".webp", ".raw", ".heif", ".heic", ".dng", ".cr2", ".nef"
+)
+
+# exiftool can hang on corrupt containers, never wait on it forever
+EXIFTOOL_TIMEOUT = 30
+
+DATETIME_TAGS = {
+    306: 'DateTime',
+    36867: 'DateTimeOriginal',
+    36868: 'DateTimeDigitized'
+}
+
+
+EXIFTOOL_ARGS = ['-j', '-a', '-u', '-g1']
+
+
+class ExifToolSession:
+    """
+    A long-lived `exiftool -stay_open` process, so repeated lookups skip the
+    Perl startup cost. Calls are serialized, use one session per thread.
+
+    A query that takes longer than timeout kills the process and starts a
+    fresh one, so a stuck exiftool costs one file, not the whole session.
+    """
+
+    READY = b'{ready}'
+
+    def __init__(self, timeout=EXIFTOOL_TIMEOUT):
+        self.timeout = timeout
+        self._start()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            ['exiftool', '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        # Pipes cannot be read with a timeout portably, a reader thread can
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self.lines), daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, lines):
+        for line in iter(stdout.readline, b''):
+            lines.put(line)
+        lines.put(b'')
+
+    def restart(self):
+        self.process.kill()
+        self.process.wait()
+        self._start()
+
+    def query(self, image_path):
+        args = EXIFTOOL_ARGS + [image_path, '-execute']
+        try:
+            self.process.stdin.write(('\n'.join(args) + '\n').encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError:
+            self.restart()
+            raise RuntimeError("exiftool exited unexpectedly")
+        output = b''
+        deadline = time.monotonic() + self.timeout
+        with metrics.subprocess_wait('exiftool'):
+            while not output.rstrip().endswith(self.READY):
+                try:
+                    line = self.lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self.restart()
+                    raise subprocess.TimeoutExpired('exiftool', self.timeout)
+                if not line:
+                    self.restart()
+                    raise RuntimeError("exiftool exited unexpectedly")
+                output += line
+        return json.loads(output.rstrip()[:-len(self.READY)])[0]
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(b'-stay_open\nFalse\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+
 
-    def extract_all_metadata(image_path):
+def extract_all_metadata(image_path, timeout=EXIFTOOL_TIMEOUT, session=None):
+    if session is not None:
+        return session.query(image_path)
+    with metrics.subprocess_wait('exiftool'):
         result = subprocess.run(
-            ['exiftool', '-j', '-a', '-u', '-g1', image_path],
-            stdout=subprocess.PIPE
+            ['exiftool'] + EXIFTOOL_ARGS + [image_path],
+            stdout=subprocess.PIPE,
+            timeout=timeout
         )
-        metadata = json.loads(result.stdout)[0]
-        return metadata
+    metadata = json.loads(result.stdout)[0]
+    return metadata
 
-    # Create hidden root window
-    root = tk.Tk()
-    root.withdraw()
-    
-    # Configure file dialog
-    supported_extensions = (
-        ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif",
-        ".webp", ".raw", ".heif", ".heic", ".dng", ".cr2", ".nef"
-    )
-    file_types = [("Image Files", " ".join(f"*{ext}" for ext in supported_extensions))]
 
-    # Show file selection dialog
-    image_path = filedialog.askopenfilename(
-        title="Select Image File",
-        filetypes=file_types
-    )
+# Geolocation extraction functions
+def get_geolocation(exif):
+    from PIL.ExifTags import GPSTAGS
 
-    # Exit if user cancels selection
-    if not image_path:
-        print("No file selected.")
-        return
+    gps_info = {}
+    if 34853 in exif:
+        for key in exif[34853].keys():
+            decoded = GPSTAGS.get(key, key)
+            gps_info[decoded] = exif[34853][key]
+    return gps_info
 
-    # Original file validation logic
-    if not (os.path.isfile(image_path) and image_path.lower().endswith(supported_extensions)):
-        print("Invalid image path or unsupported file type.")
-        return
 
-    # Rest of the original code remains unchanged...
+def dms_to_decimal(dms, ref):
+    try:
+        degrees = dms[0][0] / dms[0][1]
+        minutes = dms[1][0] / dms[1][1] / 60
+        seconds = dms[2][0] / dms[2][1] / 3600
+        decimal = degrees + minutes + seconds
+        return -decimal if ref in ('S', 'W') else decimal
+    except:
+        return None
+
+
+def extract_xmp(image_path):
+    with open(image_path, 'rb') as f:
+        content = f.read().decode('latin-1')
+    xmp_start = content.find('<x:xmpmeta')
+    xmp_end = content.find('</x:xmpmeta>')
+    if xmp_start != -1 and xmp_end != -1:
+        return content[xmp_start:xmp_end+12]
+    return None
+
+
+def extract_image_metadata(image_path):
+    """Extract EXIF, geolocation, date/time and XMP data from an image file."""
+    from PIL import Image, ExifTags
+
+    if not (os.path.isfile(image_path) and image_path.lower().endswith(SUPPORTED_EXTENSIONS)):
+        return {"error": "Invalid image path or unsupported file type."}
+
+    result = {
+        "file_path": os.path.abspath(image_path),
+        "exif": {},
+        "geolocation": {},
+        "datetime": {},
+        "xmp": None,
+        "errors": []
+    }
+
     try:
-        with Image.open(image_path) as img:
+        with metrics.span('image.exif'), Image.open(image_path) as img:
             # Get EXIF data with enhanced compatibility
             exif_data = {}
             try:
@@ -55,103 +169,127 @@ def image_handler():
                 except Exception:
                     pass
 
-            if not exif_data:
-                print("No standard EXIF data found in image")
-            else:
-                print("\n=== EXIF DATA ===")
-                for tag_id, value in exif_data.items():
-                    tag_name = ExifTags.TAGS.get(tag_id, tag_id)
-                    print(f"{tag_name}: {value}")
-
-                # Geolocation extraction functions
-                def get_geolocation(exif):
-                    gps_info = {}
-                    if 34853 in exif:
-                        for key in exif[34853].keys():
-                            decoded = GPSTAGS.get(key, key)
-                            gps_info[decoded] = exif[34853][key]
-                    return gps_info
-
-                def dms_to_decimal(dms, ref):
-                    try:
-                        degrees = dms[0][0] / dms[0][1]
-                        minutes = dms[1][0] / dms[1][1] / 60
-                        seconds = dms[2][0] / dms[2][1] / 3600
-                        decimal = degrees + minutes + seconds
-                        return -decimal if ref in ('S', 'W') else decimal
-                    except:
-                        return None
-
-                gps_data = get_geolocation(exif_data)
-                if gps_data:
-                    print("\n=== GEOLOCATION ===")
-                    lat = dms_to_decimal(
-                        gps_data.get('GPSLatitude', []),
-                        gps_data.get('GPSLatitudeRef', 'N')
-                    )
-                    lon = dms_to_decimal(
-                        gps_data.get('GPSLongitude', []),
-                        gps_data.get('GPSLongitudeRef', 'E')
-                    )
-                    
-                    if lat and lon:
-                        print(f"Latitude: {lat:.6f}")
-                        print(f"Longitude: {lon:.6f}")
-                        print(f"Google Maps: https://www.google.com/maps?q={lat},{lon}")
-                    else:
-                        print("Geolocation data incomplete or corrupted")
-                    
-                    for key, value in gps_data.items():
-                        print(f"{key}: {value}")
-                else:
-                    print("\nNo geolocation data found in EXIF")
-
-                # Date/time extraction with better formatting
-                print("\n=== DATE/TIME ===")
-                datetime_tags = {
-                    306: 'DateTime',
-                    36867: 'DateTimeOriginal',
-                    36868: 'DateTimeDigitized'
+            for tag_id, value in exif_data.items():
+                tag_name = ExifTags.TAGS.get(tag_id, tag_id)
+                result["exif"][str(tag_name)] = value
+
+            gps_data = get_geolocation(exif_data) if exif_data else {}
+            if gps_data:
+                lat = dms_to_decimal(
+                    gps_data.get('GPSLatitude', []),
+                    gps_data.get('GPSLatitudeRef', 'N')
+                )
+                lon = dms_to_decimal(
+                    gps_data.get('GPSLongitude', []),
+                    gps_data.get('GPSLongitudeRef', 'E')
+                )
+                result["geolocation"] = {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "gps_tags": {str(key): value for key, value in gps_data.items()}
                 }
-                
-                captured_time = None
-                for tag_id, tag_name in datetime_tags.items():
-                    if tag_id in exif_data:
-                        captured_time = exif_data[tag_id]
-                        try:
-                            # Improved datetime formatting
-                            formatted_time = captured_time.replace(':', '-', 2).replace(' ', 'T', 1)
-                            print(f"{tag_name}: {formatted_time}")
-                        except AttributeError:
-                            print(f"{tag_name}: {captured_time}")
-                        break
-                else:
-                    print("No date/time information found")
-
-            # Integrated XMP metadata check
-            try:
-                with open(image_path, 'rb') as f:
-                    content = f.read().decode('latin-1')
-                    xmp_start = content.find('<x:xmpmeta')
-                    xmp_end = content.find('</x:xmpmeta>')
-                    if xmp_start != -1 and xmp_end != -1:
-                        xmp_data = content[xmp_start:xmp_end+12]
-                        print("\n=== XMP METADATA ===")
-                        print(xmp_data)
-                    else:
-                        print("\nNo XMP metadata found")
-            except Exception as e:
-                print(f"\nXMP Metadata Error: {str(e)}")
 
+            for tag_id, tag_name in DATETIME_TAGS.items():
+                if tag_id in exif_data:
+                    result["datetime"][tag_name] = exif_data[tag_id]
+                    break
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    # Integrated XMP metadata check
+    try:
+        with metrics.span('image.xmp'):
+            result["xmp"] = extract_xmp(image_path)
+        metrics.count('bytes_read', os.path.getsize(image_path), stage='image.xmp')
     except Exception as e:
-        print(f"\nERROR: {str(e)}")
-        if "cannot identify image file" in str(e):
+        result["errors"].append(f"XMP Metadata Error: {str(e)}")
+
+    return result
+
+
+def print_image_metadata(result):
+    if "error" in result:
+        error = result["error"]
+        print(f"\nERROR: {error}")
+        if "cannot identify image file" in error:
             print("The file might be corrupted or not a supported image format")
-        elif "truncated" in str(e):
+        elif "truncated" in error:
             print("The image file appears to be truncated")
-        elif "Permission denied" in str(e):
+        elif "Permission denied" in error:
             print("Permission denied - check file access rights")
+        return
+
+    if not result["exif"]:
+        print("No standard EXIF data found in image")
+    else:
+        print("\n=== EXIF DATA ===")
+        for tag_name, value in result["exif"].items():
+            print(f"{tag_name}: {value}")
+
+        gps = result["geolocation"]
+        if gps:
+            print("\n=== GEOLOCATION ===")
+            lat, lon = gps["latitude"], gps["longitude"]
+            if lat and lon:
+                print(f"Latitude: {lat:.6f}")
+                print(f"Longitude: {lon:.6f}")
+                print(f"Google Maps: https://www.google.com/maps?q={lat},{lon}")
+            else:
+                print("Geolocation data incomplete or corrupted")
+
+            for key, value in gps["gps_tags"].items():
+                print(f"{key}: {value}")
+        else:
+            print("\nNo geolocation data found in EXIF")
+
+        # Date/time extraction with better formatting
+        print("\n=== DATE/TIME ===")
+        if result["datetime"]:
+            for tag_name, captured_time in result["datetime"].items():
+                try:
+                    # Improved datetime formatting
+                    formatted_time = captured_time.replace(':', '-', 2).replace(' ', 'T', 1)
+                    print(f"{tag_name}: {formatted_time}")
+                except AttributeError:
+                    print(f"{tag_name}: {captured_time}")
+        else:
+            print("No date/time information found")
+
+    if result["xmp"]:
+        print("\n=== XMP METADATA ===")
+        print(result["xmp"])
+    else:
+        print("\nNo XMP metadata found")
+
+    for error in result["errors"]:
+        print(f"\n{error}")
+
+
+def image_handler():
+    import tkinter as tk
+    from tkinter import filedialog
+
+    # Create hidden root window
+    root = tk.Tk()
+    root.withdraw()
+
+    # Configure file dialog
+    file_types = [("Image Files", " ".join(f"*{ext}" for ext in SUPPORTED_EXTENSIONS))]
+
+    # Show file selection dialog
+    image_path = filedialog.askopenfilename(
+        title="Select Image File",
+        filetypes=file_types
+    )
+
+    # Exit if user cancels selection
+    if not image_path:
+        print("No file selected.")
+        return
+
+    print_image_metadata(extract_image_metadata(image_path))
 
 # Entry point
 if __name__ == "__main__":
-    image_handler()
\ No newline at end of file
+    image_handler()
@@ -0,0 +1,17 @@
+"""
+Forkserver preload for the daemon's budget workers (see
+handlers.daemon.worker_context()). Importing this module maps the known-hash
+indexes listed in IMAZER_KNOWN_INDEXES, so every worker forked from the
+forkserver inherits the mappings instead of opening each index itself.
+"""
+import os
+
+from handlers.known_hashes import INDEXES_ENV, load_index
+
+for _path in filter(None, os.environ.get(INDEXES_ENV, "").split(os.pathsep)):
+    try:
+        load_index(_path)
+    except (OSError, ValueError):
+        # An exception here would kill the forkserver; the worker that
+        # needs the index opens it itself and reports the error
+        pass
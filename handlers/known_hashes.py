@@ -0,0 +1,317 @@
+"""
+Known-file hash sets (NSRL-style known-good and known-bad lists).
+
+Hash lists are imported once into a compact binary index that is memory
+mapped at lookup time:
+
+    header | prefix table | Bloom filter | sorted records
+
+Each record is the raw digest followed by one status byte. The prefix table
+holds the first record for every 16-bit digest prefix, so a lookup is a Bloom
+probe, usually rejecting unknown files without touching the records, then a
+binary search over a bucket of a few hundred entries at most. Memory use is
+what the OS pages in; on disk a SHA-1 entry costs 21 bytes plus
+about 10 Bloom bits.
+
+Build an index with:
+    python -m handlers.known_hashes build nsrl.kh --good NSRLFile.txt --bad bad.txt --algorithm sha1
+"""
+import csv
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b"IMZKH\x00\x01\x00"
+HEADER = struct.Struct("<8s16sIQQI")
+HEADER_SIZE = 64
+PREFIX_BITS = 16
+PREFIX_ENTRIES = (1 << PREFIX_BITS) + 1
+
+STATUS_KNOWN = 0
+STATUS_NOTABLE = 1
+STATUS_NAMES = {STATUS_KNOWN: "known", STATUS_NOTABLE: "notable"}
+
+# Sorted runs of this many entries are spilled to disk while importing, so
+# lists with tens of millions of hashes never have to fit in memory
+RUN_ENTRIES = 2_000_000
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# os.pathsep-separated index paths handlers.index_preload maps in the
+# daemon's forkserver
+INDEXES_ENV = "IMAZER_KNOWN_INDEXES"
+
+
+def _bloom_positions(digest, bits, k):
+    # Digests are already uniformly distributed, so two words of the digest
+    # itself drive double hashing instead of k separate hash functions
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(k)]
+
+
+def _bloom_size(count, fp_rate=BLOOM_FALSE_POSITIVE_RATE):
+    count = max(count, 1)
+    bits = int(-count * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = max(64, (bits + 63) // 64 * 64)
+    k = max(1, round(bits / count * math.log(2)))
+    return bits, k
+
+
+def iter_hash_list(path, algorithm):
+    """
+    Yield raw digests for `algorithm` from a hash list.
+
+    Accepts NSRL-style CSV files with a header row naming the column
+    ("SHA-1", "MD5", ...) and plain lists with the hex digest as the first
+    token of each line (md5sum/sha1sum output, one hash per line).
+    """
+    hex_length = hashlib.new(algorithm).digest_size * 2
+    wanted = algorithm.replace("_", "").lower()
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        first = f.readline()
+        column = None
+        if "," in first:
+            header = next(csv.reader([first]))
+            names = [name.strip().replace("-", "").replace("_", "").lower() for name in header]
+            if wanted in names:
+                column = names.index(wanted)
+        if column is not None:
+            for row in csv.reader(f):
+                if len(row) > column:
+                    value = row[column].strip().strip('"')
+                    if len(value) == hex_length:
+                        try:
+                            yield bytes.fromhex(value)
+                        except ValueError:
+                            continue
+            return
+        for line in _chain(first, f):
+            token = line.strip().replace(",", " ").split(" ", 1)[0].strip('"')
+            if len(token) == hex_length:
+                try:
+                    yield bytes.fromhex(token)
+                except ValueError:
+                    continue
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def _write_run(records, directory):
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(records))
+    return path
+
+
+def _read_run(path, record_size):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(record_size * 65536)
+            if not block:
+                return
+            for offset in range(0, len(block), record_size):
+                yield block[offset:offset + record_size]
+
+
+def build_index(output_path, sources, algorithm="sha1", fp_rate=BLOOM_FALSE_POSITIVE_RATE):
+    """
+    Import hash lists into a known-hash index at output_path.
+
+    sources is a list of (path, status) pairs with status STATUS_KNOWN or
+    STATUS_NOTABLE. A digest listed as both is kept as notable.
+    Returns the number of unique digests written.
+    """
+    digest_size = hashlib.new(algorithm).digest_size
+    record_size = digest_size + 1
+    work_dir = tempfile.mkdtemp(prefix="imazer-kh-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        runs = []
+        total = 0
+        buffer = []
+        for path, status in sources:
+            status_byte = bytes([status])
+            for digest in iter_hash_list(path, algorithm):
+                buffer.append(digest + status_byte)
+                if len(buffer) >= RUN_ENTRIES:
+                    runs.append(_write_run(buffer, work_dir))
+                    total += len(buffer)
+                    buffer = []
+        if buffer:
+            runs.append(_write_run(buffer, work_dir))
+            total += len(buffer)
+
+        # Duplicates only shrink the set, so sizing the filter for the raw
+        # total keeps the false-positive rate at or below fp_rate
+        bloom_bits, bloom_k = _bloom_size(total, fp_rate)
+        bloom = bytearray(bloom_bits // 8)
+        prefix = array("Q", [0]) * PREFIX_ENTRIES
+        shift = digest_size * 8 - PREFIX_BITS
+        count = 0
+        records_path = os.path.join(work_dir, "records")
+        with open(records_path, "wb") as records:
+
+            def emit(record):
+                digest = record[:digest_size]
+                records.write(record)
+                prefix[(int.from_bytes(digest, "big") >> shift) + 1] += 1
+                for position in _bloom_positions(digest, bloom_bits, bloom_k):
+                    bloom[position >> 3] |= 1 << (position & 7)
+
+            pending = None
+            for record in heapq.merge(*(_read_run(run, record_size) for run in runs)):
+                # Runs sort by digest then status, so the last duplicate has the highest status
+                if pending is not None and pending[:digest_size] != record[:digest_size]:
+                    emit(pending)
+                    count += 1
+                pending = record
+            if pending is not None:
+                emit(pending)
+                count += 1
+
+        for i in range(1, PREFIX_ENTRIES):
+            prefix[i] += prefix[i - 1]
+        if sys.byteorder == "big":
+            prefix.byteswap()
+
+        with open(output_path, "wb") as out:
+            header = HEADER.pack(MAGIC, algorithm.encode("ascii"), digest_size, count, bloom_bits, bloom_k)
+            out.write(header.ljust(HEADER_SIZE, b"\x00"))
+            out.write(prefix.tobytes())
+            out.write(bloom)
+            with open(records_path, "rb") as records:
+                shutil.copyfileobj(records, out, 1024 * 1024)
+        return count
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class KnownHashIndex:
+    """Read-only, memory-mapped view of an index written by build_index()."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, algorithm, digest_size, count, bloom_bits, bloom_k = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a known-hash index")
+        self.algorithm = algorithm.rstrip(b"\x00").decode("ascii")
+        self.digest_size = digest_size
+        self.count = count
+        self.bloom_bits = bloom_bits
+        self.bloom_k = bloom_k
+        self._record_size = digest_size + 1
+        self._shift = digest_size * 8 - PREFIX_BITS
+        prefix_start = HEADER_SIZE
+        self._bloom_start = prefix_start + PREFIX_ENTRIES * 8
+        self._records_start = self._bloom_start + bloom_bits // 8
+        self._prefix = array("Q")
+        self._prefix.frombytes(self._mm[prefix_start:self._bloom_start])
+        if sys.byteorder == "big":
+            self._prefix.byteswap()
+
+    def _maybe_contains(self, digest):
+        mm = self._mm
+        start = self._bloom_start
+        for position in _bloom_positions(digest, self.bloom_bits, self.bloom_k):
+            if not mm[start + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def lookup(self, hex_digest):
+        """Return "known", "notable" or None for a hex digest of this index's algorithm."""
+        try:
+            digest = bytes.fromhex(hex_digest)
+        except (TypeError, ValueError):
+            return None
+        if len(digest) != self.digest_size or not self._maybe_contains(digest):
+            return None
+        bucket = int.from_bytes(digest, "big") >> self._shift
+        lo, hi = self._prefix[bucket], self._prefix[bucket + 1]
+        mm, size, base = self._mm, self._record_size, self._records_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * size
+            candidate = mm[offset:offset + self.digest_size]
+            if candidate < digest:
+                lo = mid + 1
+            elif candidate > digest:
+                hi = mid
+            else:
+                return STATUS_NAMES.get(mm[offset + self.digest_size], "notable")
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+
+_open_indexes = {}
+
+
+def load_index(path):
+    """
+    Open an index once per process. Budget workers forked after the first
+    call inherit the mapping, as do workers of the daemon's forkserver, which
+    maps the indexes itself (handlers.index_preload). Spawned workers open
+    their own.
+    """
+    index = _open_indexes.get(path)
+    if index is None:
+        index = _open_indexes[path] = KnownHashIndex(path)
+    return index
+
+
+def known_file_verdict(hashes, index_paths):
+    """
+    Check a calculate_forensic_hashes() result against known-hash indexes.
+    A notable (known-bad) hit in any index wins over a known-good one.
+    """
+    verdict = {"status": "unknown"}
+    for path in index_paths:
+        index = load_index(path)
+        status = index.lookup(hashes.get(index.algorithm, ""))
+        if status is None:
+            continue
+        verdict = {"status": status, "algorithm": index.algorithm, "index": os.path.basename(path)}
+        if status == "notable":
+            break
+    return verdict
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build an IMAZER known-hash index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="import hash lists into an index")
+    build.add_argument("output")
+    build.add_argument("--good", nargs="*", default=[], help="known-good hash lists (e.g. NSRL)")
+    build.add_argument("--bad", nargs="*", default=[], help="known-bad / notable hash lists")
+    build.add_argument("--algorithm", default="sha1", help="md5, sha1 or sha256 (default sha1)")
+    lookup = subparsers.add_parser("lookup", help="look digests up in an index")
+    lookup.add_argument("index")
+    lookup.add_argument("digests", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        sources = [(path, STATUS_KNOWN) for path in args.good] + [(path, STATUS_NOTABLE) for path in args.bad]
+        written = build_index(args.output, sources, args.algorithm)
+        print(f"Wrote {written} {args.algorithm} digests to {args.output}")
+    else:
+        index = KnownHashIndex(args.index)
+        for digest in args.digests:
+            print(f"{digest}: {index.lookup(digest) or 'unknown'}")
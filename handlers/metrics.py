@@ -0,0 +1,352 @@
+"""
+Lightweight instrumentation for the analysis hot paths.
+
+    with metrics.span("pdf.text"):          # time a handler stage
+        ...
+    with metrics.subprocess_wait("ffprobe"): # time spent blocked on a child process
+        ...
+    metrics.count("bytes_read", size, stage="hashes")
+
+Everything is off until enable() is called; a disabled span() or count() is
+one global check, so instrumentation stays in the code permanently. Budget
+workers run in separate processes and send their registry back with the
+result (see handlers.budget), so batch and daemon totals cover every file.
+
+Exports are a JSON summary and a Prometheus text file (textfile collector
+format, rewritten atomically).
+"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# The Prometheus file is rewritten at most this often by export(force=False)
+EXPORT_INTERVAL = 15.0
+PROFILE_DIR = "imazer_profiles"
+TRACEMALLOC_TOP = 10
+
+# (family, Prometheus name, label, help)
+HISTOGRAMS = {
+    "stage": ("imazer_stage_seconds", "stage", "Wall-clock time spent in each handler stage."),
+    "subprocess": ("imazer_subprocess_wait_seconds", "tool", "Time spent waiting on child processes."),
+}
+
+_enabled = False
+_config = {}
+_lock = threading.Lock()
+# Serializes export() across daemon threads, separate from the registry lock
+_export_lock = threading.Lock()
+_started = time.time()
+_last_export = 0.0
+_histograms = {}  # (family, name) -> [count, sum, max, bucket counts...]
+_counters = {}    # (name, ((label, value), ...)) -> value
+_gauges = {}      # (name, ((label, value), ...)) -> value
+_samples = []     # profile / tracemalloc captures
+
+
+def enable(json_path=None, prom_path=None, profile_rate=0.0, tracemalloc_rate=0.0, profile_dir=PROFILE_DIR):
+    """
+    Turn instrumentation on. profile_rate and tracemalloc_rate are the
+    fractions of files analyzed under cProfile and tracemalloc.
+    """
+    global _enabled, _config
+    _config = {
+        "json_path": json_path,
+        "prom_path": prom_path,
+        "profile_rate": profile_rate or 0.0,
+        "tracemalloc_rate": tracemalloc_rate or 0.0,
+        "profile_dir": profile_dir,
+    }
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+def worker_config():
+    """Settings a budget worker needs to record (but not export) metrics, None when disabled."""
+    if not _enabled:
+        return None
+    return {key: value for key, value in _config.items() if key not in ("json_path", "prom_path")}
+
+
+def start_worker(config):
+    """Reset the registry inherited from the parent and record with config."""
+    reset()
+    if config is not None:
+        enable(**config)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+        del _samples[:]
+
+
+class _Span:
+    __slots__ = ("family", "name", "start")
+
+    def __init__(self, family, name):
+        self.family = family
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.family, self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """Time a handler stage, e.g. span("pdf.text")."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span("stage", stage)
+
+
+def subprocess_wait(tool):
+    """Time spent blocked on a child process (exiftool, ffprobe, budget workers)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span("subprocess", tool)
+
+
+def observe(family, name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        entry = _histograms.get((family, name))
+        if entry is None:
+            entry = _histograms[(family, name)] = [0, 0.0, 0.0] + [0] * len(BUCKETS)
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[3 + i] += 1
+                break
+
+
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+class _Profile:
+    __slots__ = ("file_path", "profiler", "tracing")
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.profiler = None
+        self.tracing = False
+
+    def __enter__(self):
+        if _config["profile_rate"] and random.random() < _config["profile_rate"]:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if _config["tracemalloc_rate"] and random.random() < _config["tracemalloc_rate"] \
+                and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        sample = {}
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(_config["profile_dir"], exist_ok=True)
+            name = f"{os.path.basename(self.file_path)}.{os.getpid()}.{time.time_ns()}.prof"
+            path = os.path.join(_config["profile_dir"], name)
+            self.profiler.dump_stats(path)
+            sample["profile"] = path
+        if self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sample["peak_traced_mb"] = round(peak / (1024 * 1024), 3)
+            sample["top_allocations"] = [
+                {"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]
+            ]
+        if sample:
+            sample["file"] = os.path.abspath(self.file_path)
+            with _lock:
+                _samples.append(sample)
+        return False
+
+
+def profile(file_path):
+    """
+    Capture cProfile and/or tracemalloc data for a sampled fraction of files.
+
+    cProfile only sees the calling thread. tracemalloc is process-wide, so
+    with several daemon threads its numbers include their allocations too,
+    and only one capture runs at a time.
+    """
+    if not _enabled or not (_config["profile_rate"] or _config["tracemalloc_rate"]):
+        return _NULL_SPAN
+    return _Profile(file_path)
+
+
+def drain():
+    """Return this process's registry as plain data and clear it (for merge())."""
+    with _lock:
+        data = {
+            "histograms": [[family, name, values] for (family, name), values in _histograms.items()],
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            "samples": list(_samples),
+        }
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+        del _samples[:]
+    return data
+
+
+def merge(data):
+    """Fold a worker's drain() into this process's registry."""
+    if not _enabled or not data:
+        return
+    with _lock:
+        for family, name, values in data["histograms"]:
+            entry = _histograms.get((family, name))
+            if entry is None:
+                _histograms[(family, name)] = list(values)
+                continue
+            entry[0] += values[0]
+            entry[1] += values[1]
+            entry[2] = max(entry[2], values[2])
+            for i in range(3, len(entry)):
+                entry[i] += values[i]
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            _counters[key] = _counters.get(key, 0) + value
+        _samples.extend(data["samples"])
+
+
+def summary():
+    """Current totals as a JSON-friendly dict."""
+    def timings(family):
+        return {
+            name: {
+                "count": values[0],
+                "total_s": round(values[1], 6),
+                "mean_ms": round(values[1] / values[0] * 1000, 3) if values[0] else 0.0,
+                "max_ms": round(values[2] * 1000, 3),
+            }
+            for (kind, name), values in sorted(_histograms.items()) if kind == family
+        }
+
+    with _lock:
+        return {
+            "enabled": _enabled,
+            "uptime_s": round(time.time() - _started, 3),
+            "stages": timings("stage"),
+            "subprocess_wait": timings("subprocess"),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_gauges.items())
+            ],
+            "samples": list(_samples),
+        }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        for family, (metric, label, help_text) in HISTOGRAMS.items():
+            entries = sorted((name, values) for (kind, name), values in _histograms.items() if kind == family)
+            if not entries:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, values in entries:
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, values[3:]):
+                    cumulative += bucket
+                    lines.append(f"{metric}_bucket{_label_text([(label, name), ('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{_label_text([(label, name), ('le', '+Inf')])} {values[0]}")
+                lines.append(f"{metric}_sum{_label_text([(label, name)])} {values[1]:.6f}")
+                lines.append(f"{metric}_count{_label_text([(label, name)])} {values[0]}")
+        for kind, registry in (("counter", _counters), ("gauge", _gauges)):
+            seen = set()
+            for (name, labels), value in sorted(registry.items()):
+                metric = f"imazer_{name}_total" if kind == "counter" else f"imazer_{name}"
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric}{_label_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def export(force=True):
+    """
+    Write the configured JSON summary and Prometheus file. With force=False
+    nothing is written if the last export was under EXPORT_INTERVAL ago.
+    """
+    global _last_export
+    if not _enabled:
+        return
+    with _export_lock:
+        now = time.monotonic()
+        if not force and now - _last_export < EXPORT_INTERVAL:
+            return
+        _last_export = now
+        if _config.get("json_path"):
+            _write_atomic(_config["json_path"], json.dumps(summary(), indent=2, default=str))
+        if _config.get("prom_path"):
+            _write_atomic(_config["prom_path"], prometheus_text())
@@ -5,7 +5,8 @@ from pdfminer.high_level import extract_text
 from pdfminer.pdfparser import PDFParser
 from pdfminer.pdfdocument import PDFDocument, PDFTextExtractionNotAllowed
 from tkinter import Tk, filedialog
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+from handlers import metrics
 
 class PDF_Handler:
     def __init__(self, pdf_path: str = None):
@@ -124,22 +125,37 @@ class PDF_Handler:
             'contains_url': bool(re.findall(r'https?://\S+', self.raw_text))
         })
 
-    def analyze(self) -> None:
+    def analyze(self, on_section: Optional[Callable[[str, object], None]] = None) -> None:
         if not self.pdf_path or not os.path.isfile(self.pdf_path):
             self.errors.append("Invalid PDF file path")
             return
         try:
-            self._extract_metadata()
+            metrics.count('bytes_read', os.path.getsize(self.pdf_path), stage='pdf')
+            with metrics.span('pdf.metadata'):
+                self._extract_metadata()
+            if on_section:
+                on_section('metadata', self.metadata)
             try:
-                self.raw_text = extract_text(self.pdf_path)
+                with metrics.span('pdf.text'):
+                    self.raw_text = extract_text(self.pdf_path)
             except PDFTextExtractionNotAllowed:
                 self.errors.append("Text extraction not allowed by PDF permissions")
                 return
-            self._extract_geolocations()
-            self._analyze_content()
+            with metrics.span('pdf.content'):
+                self._extract_geolocations()
+                self._analyze_content()
         except Exception as e:
             self.errors.append(f'Analysis failed: {str(e)}')
 
+    def results(self) -> Dict:
+        return {
+            'file_path': os.path.abspath(self.pdf_path) if self.pdf_path else None,
+            'metadata': self.metadata,
+            'geolocations': self.geolocations,
+            'content_analysis': self.content_analysis,
+            'errors': self.errors
+        }
+
     def print_results(self) -> None:
         print("\n=== Metadata ===")
         print(json.dumps(self.metadata, indent=4))
@@ -0,0 +1,295 @@
+"""
+Raw-byte structural scan of PDF files for triage.
+
+pdfminer has to build the whole object graph before it can say anything.
+This scanner never parses objects. It memory-maps the file and counts the
+structural markers that matter for triage: incremental updates (%%EOF and
+startxref), objects, streams, xref tables and streams, and action and
+payload names such as /JavaScript, /OpenAction and /EmbeddedFile.
+
+The file is read once, in windows of about WINDOW bytes that end just after
+a newline, and no marker spans a newline. Each window is searched with
+bytes.count() and with findall() on patterns that start with a literal.
+Both run in C at memchr-like speed, so the Python code only sees the counts.
+
+A linearized file has a second startxref/%%EOF pair for its first-page
+xref section. That pair is not counted as an incremental update.
+
+Names hidden with #xx escapes (/J#61vaScript) are decoded. Flate-compressed
+object streams are inflated and searched too, so names packed into an
+/ObjStm are not missed.
+
+The last /CreationDate and /ModDate strings in the file (normally the Info
+dictionary of the latest revision) are kept as "info_dates", so PDFs that
+triage skips still have their dates on the timeline.
+"""
+import mmap
+import os
+import re
+import zlib
+from collections import Counter
+
+WINDOW = 16 * 1024 * 1024
+# How far back from the nominal window end to look for a newline to cut at
+SPLIT_SEARCH = 1024 * 1024
+HEADER_SEARCH = 1024
+# How far past the header the first object (a linearization dictionary) may end
+LINEARIZATION_SEARCH = 4096
+# Whitespace and padding after the last %%EOF that is not worth flagging
+TRAILING_SLACK = 64
+# Stop inflating object streams once this much has been decompressed
+MAX_INFLATED_BYTES = 64 * 1024 * 1024
+
+TRACKED_NAMES = (
+    "JavaScript", "JS", "OpenAction", "AA", "Launch", "EmbeddedFile", "EmbeddedFiles",
+    "URI", "SubmitForm", "GoToR", "AcroForm", "XFA", "RichMedia", "JBIG2Decode",
+    "Encrypt", "ObjStm", "XRef", "Page", "Pages",
+)
+
+# A regular PDF name character, i.e. not whitespace or a delimiter
+_NAME_CHARS = rb"[^\x00\t\n\f\r ()<>\[\]{}/%]"
+_NAMES = re.compile(
+    rb"/(" + b"|".join(re.escape(name.encode()) for name in sorted(TRACKED_NAMES, key=len, reverse=True))
+    + rb")(?!" + _NAME_CHARS + rb")"
+)
+# Only names with a #xx escape somewhere; checked in Python, they are rare
+_ESCAPED_NAMES = re.compile(rb"#[0-9A-Fa-f]{2}")
+_NAME_AROUND = re.compile(rb"/(" + _NAME_CHARS + rb"*)$")
+_NAME_REST = re.compile(_NAME_CHARS + rb"*")
+_HEX_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_OBJ = re.compile(rb"obj(?![A-Za-z0-9])")
+_OBJSTM_COUNT = re.compile(rb"/N[\x00\t\n\f\r ]+(\d+)")
+_WHITESPACE = b"\x00\t\n\f\r "
+INFO_DATE_KEYS = (b"/CreationDate", b"/ModDate")
+# A date key followed by a literal or hex string, matched at a key's offset
+_INFO_DATE = re.compile(
+    rb"/(CreationDate|ModDate)[\x00\t\n\f\r ]*"
+    rb"(?:\(((?:[^()\\]|\\.){0,128})\)|<([0-9A-Fa-f\x00\t\n\f\r ]{0,512})>)"
+)
+_LITERAL_ESCAPE = re.compile(rb"\\(.)", re.DOTALL)
+
+# flag -> names whose presence raises it
+NAME_FLAGS = {
+    "javascript": ("JavaScript", "JS"),
+    "auto_action": ("OpenAction", "AA"),
+    "launch": ("Launch",),
+    "embedded_file": ("EmbeddedFile", "EmbeddedFiles"),
+    "remote_action": ("SubmitForm", "GoToR"),
+    "xfa": ("XFA",),
+    "rich_media": ("RichMedia",),
+    "jbig2": ("JBIG2Decode",),
+    "encrypted": ("Encrypt",),
+}
+
+
+def _escaped_names(data):
+    """Decode names containing #xx escapes; yields (decoded name, end offset)."""
+    position = 0
+    for match in _ESCAPED_NAMES.finditer(data):
+        if match.start() < position:
+            continue
+        head = _NAME_AROUND.search(data, max(0, match.start() - 128), match.start())
+        if head is None:
+            continue
+        tail = _NAME_REST.match(data, match.start())
+        position = tail.end()
+        raw = head.group(1) + data[match.start():position]
+        yield _HEX_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), raw).decode("latin-1"), position
+
+
+def _scan_names(data, names, obfuscated):
+    names.update(name.decode("ascii") for name in _NAMES.findall(data))
+    for name, _ in _escaped_names(data):
+        if name in names:
+            names[name] += 1
+            obfuscated.append(name)
+
+
+def _info_date(data, offset):
+    """Decode the date string after the key at offset, None if it is not a string."""
+    match = _INFO_DATE.match(data, offset)
+    if match is None:
+        return None
+    if match.group(3) is not None:
+        digits = re.sub(rb"[^0-9A-Fa-f]", b"", match.group(3))
+        # An odd final digit is read as if followed by 0
+        raw = bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode("ascii"))
+    else:
+        raw = _LITERAL_ESCAPE.sub(rb"\1", match.group(2))
+    if raw.startswith(b"\xfe\xff"):
+        return raw[2:].decode("utf-16-be", errors="replace")
+    return raw.decode("latin-1")
+
+
+def _find_info_dates(data):
+    """The last CreationDate and ModDate strings in data."""
+    dates = {}
+    for key in INFO_DATE_KEYS:
+        position = data.rfind(key)
+        value = _info_date(data, position) if position >= 0 else None
+        if value is not None:
+            dates[key[1:].decode("ascii")] = value
+    return dates
+
+
+def _inflate_object_streams(mm, names, obfuscated, info_dates):
+    """
+    Inflate Flate-encoded /ObjStm streams and count the names inside them.
+    Info dates not found in the raw bytes are taken from the streams.
+    """
+    raw_dates = set(info_dates)
+    inflated = 0
+    compressed_objects = 0
+    uninspected = 0
+    position = mm.find(b"/ObjStm")
+    while position >= 0:
+        position += len(b"/ObjStm")
+        dict_start = mm.rfind(b"obj", max(0, position - 4096), position)
+        stream = mm.find(b"stream", position, position + 4096)
+        data_end = mm.find(b"endstream", stream) if stream >= 0 else -1
+        dictionary = mm[dict_start:stream] if dict_start >= 0 and stream >= 0 else b""
+        count = _OBJSTM_COUNT.search(dictionary)
+        if count:
+            compressed_objects += int(count.group(1))
+        if data_end < 0 or b"/FlateDecode" not in dictionary or b"/DecodeParms" in dictionary \
+                or inflated >= MAX_INFLATED_BYTES:
+            uninspected += 1
+        else:
+            data_start = stream + len(b"stream")
+            data_start += 2 if mm[data_start:data_start + 2] == b"\r\n" else 1
+            try:
+                data = zlib.decompressobj().decompress(mm[data_start:data_end], MAX_INFLATED_BYTES - inflated)
+                inflated += len(data)
+                # Names inside object streams are invisible to the raw pass
+                _scan_names(data, names, obfuscated)
+                for key, value in _find_info_dates(data).items():
+                    if key not in raw_dates:
+                        info_dates[key] = value
+            except zlib.error:
+                uninspected += 1
+        position = mm.find(b"/ObjStm", max(position, data_end))
+    return {"compressed_objects": compressed_objects, "inflated_bytes": inflated, "uninspected": uninspected}
+
+
+def scan_pdf_structure(pdf_path, inflate_object_streams=True):
+    """
+    Count structural markers of a PDF in a single pass over its raw bytes.
+
+    Returns counts, the raw "info_dates", the derived triage "flags" and
+    "needs_full_analysis", which is True when anything was flagged.
+    """
+    file_size = os.path.getsize(pdf_path)
+    names = Counter(dict.fromkeys(TRACKED_NAMES, 0))
+    obfuscated = []
+    counts = Counter()
+    header_offset = None
+    version = None
+    linearized = False
+    trailing = b""
+    info_dates = {}
+    object_streams = {"compressed_objects": 0, "inflated_bytes": 0, "uninspected": 0}
+
+    if file_size:
+        with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_offset = mm.find(b"%PDF-", 0, HEADER_SEARCH)
+            if header_offset >= 0:
+                version = mm[header_offset + 5:header_offset + 8].decode("latin-1")
+                # A linearization dictionary must be the first object in the file
+                first = mm.find(b"obj", header_offset, header_offset + LINEARIZATION_SEARCH)
+                end = mm.find(b"endobj", first, first + LINEARIZATION_SEARCH) if first >= 0 else -1
+                linearized = end >= 0 and mm.find(b"/Linearized", first, end) >= 0
+            else:
+                header_offset = None
+
+            last_eof = -1
+            date_offsets = {}
+            start = 0
+            while start < file_size:
+                stop = min(start + WINDOW, file_size)
+                if stop < file_size:
+                    newline = mm.rfind(b"\n", max(start, stop - SPLIT_SEARCH), stop)
+                    stop = newline + 1 if newline >= 0 else stop
+                window = mm[start:stop]
+                for marker in (b"%%EOF", b"startxref", b"xref", b"endstream", b"endobj"):
+                    counts[marker] += window.count(marker)
+                counts[b"obj"] += len(_OBJ.findall(window))
+                eof = window.rfind(b"%%EOF")
+                if eof >= 0:
+                    last_eof = start + eof
+                _scan_names(window, names, obfuscated)
+                for key in INFO_DATE_KEYS:
+                    position = window.rfind(key)
+                    if position >= 0:
+                        date_offsets[key] = start + position
+                start = stop
+
+            # Matched on the map, a string may continue past the window
+            for key, position in date_offsets.items():
+                value = _info_date(mm, position)
+                if value is not None:
+                    info_dates[key[1:].decode("ascii")] = value
+
+            if inflate_object_streams and names["ObjStm"]:
+                object_streams = _inflate_object_streams(mm, names, obfuscated, info_dates)
+            if last_eof >= 0:
+                trailing = mm[last_eof + 5:].strip(_WHITESPACE)
+
+    eof_markers = counts[b"%%EOF"]
+    startxrefs = counts[b"startxref"]
+    revisions = max(eof_markers, startxrefs, 1)
+    if linearized and revisions > 1:
+        # The first-page xref section of a linearized file has its own startxref/%%EOF
+        revisions -= 1
+    structure = {
+        "file_size": file_size,
+        "pdf_version": version,
+        "header_offset": header_offset,
+        "linearized": linearized,
+        # Every "obj" token that is not the end of an "endobj"
+        "objects": counts[b"obj"] - counts[b"endobj"],
+        "streams": counts[b"endstream"],
+        "xref_tables": counts[b"xref"] - startxrefs,
+        "xref_streams": names["XRef"],
+        "startxref": startxrefs,
+        "eof_markers": eof_markers,
+        "incremental_updates": revisions - 1,
+        "trailing_bytes": len(trailing),
+        "pages": names["Page"],
+        "names": {f"/{name}": names[name] for name in TRACKED_NAMES},
+        "obfuscated_names": sorted(set(f"/{name}" for name in obfuscated)),
+        "object_streams": {"count": names["ObjStm"], **object_streams},
+        "info_dates": info_dates,
+    }
+
+    flags = [flag for flag, flag_names in NAME_FLAGS.items() if any(names[name] for name in flag_names)]
+    if structure["incremental_updates"]:
+        flags.append("incremental_updates")
+    if obfuscated:
+        flags.append("obfuscated_names")
+    if len(trailing) > TRAILING_SLACK:
+        flags.append("trailing_data")
+    if header_offset is None:
+        flags.append("no_pdf_header")
+    elif header_offset:
+        flags.append("header_offset")
+    if names["ObjStm"] and (not inflate_object_streams or object_streams["uninspected"]):
+        # Whatever is packed in there was not seen
+        flags.append("uninspected_object_streams")
+    structure["flags"] = flags
+    structure["needs_full_analysis"] = bool(flags)
+    return structure
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m handlers.pdf_structure <file.pdf> [...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        try:
+            record = {"file": path, "structure": scan_pdf_structure(path)}
+        except (OSError, ValueError) as e:
+            record = {"file": path, "error": str(e)}
+        print(json.dumps(record))
@@ -0,0 +1,477 @@
+"""
+Forensic timeline: every timestamp the handlers find, normalized to UTC.
+
+extract_events() turns an analysis result into events during analysis. It
+covers:
+
+    filesystem  mtime / atime / ctime of the file itself
+    mediainfo   encoded, tagged, recorded ... dates of audio containers
+    exif        DateTime, DateTimeOriginal, DateTimeDigitized (+ OffsetTime*)
+                and the GPS date/time stamp, which is UTC by definition
+    xmp         xmp:CreateDate, ModifyDate, MetadataDate, ...
+    pdf_info    CreationDate / ModDate in PDF "D:" syntax, from pdfminer or,
+                for PDFs triage skipped, the structural scan
+    ffprobe     creation_time and other date tags of the container and streams
+
+Each event has an integer epoch in microseconds. tz_assumed marks values
+that carried no zone (plain EXIF, some PDF dates) and were read as UTC.
+
+TimelineStore keeps events in SQLite. The events table is clustered on
+(time, file, label), so a time-range query is one B-tree seek followed by a
+sequential scan, and a second index on (file, time) serves per-file queries.
+Both stay fast at tens of millions of events. An event that is already
+stored (same time, file and label) is not stored again.
+
+Query or export a store with:
+    python -m handlers.timeline query case.timeline --start 2023-06-01 --end 2023-07-01
+    python -m handlers.timeline export case.timeline supertimeline.csv --format csv
+"""
+import csv
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+EXPORT_FORMATS = ("csv", "tln", "ndjson")
+CSV_COLUMNS = ("utc", "epoch_us", "source", "kind", "artifact", "field", "raw", "tz_assumed")
+
+# EXIF date tag -> the tag holding its UTC offset (EXIF 2.31)
+EXIF_DATE_TAGS = {
+    "DateTime": "OffsetTime",
+    "DateTimeOriginal": "OffsetTimeOriginal",
+    "DateTimeDigitized": "OffsetTimeDigitized",
+}
+PDF_DATE_KEYS = ("CreationDate", "ModDate")
+
+_PDF_DATE = re.compile(
+    r"^(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?\s*(?:(Z|[+\-])(\d{2})?'?(\d{2})?'?)?"
+)
+_EXIF_DATE = re.compile(
+    r"^(\d{4}):(\d{2}):(\d{2})[ T](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?\s*(Z|[+\-]\d{2}:?\d{2})?$"
+)
+_ISO_DATE = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?)?\s*(Z|UTC|[+\-]\d{2}:?\d{2})?$",
+    re.IGNORECASE
+)
+_OFFSET = re.compile(r"^([+\-])(\d{2}):?(\d{2})$")
+_XMP_DATE = re.compile(
+    r"(xmp|exif|photoshop|pdf|xap):(CreateDate|ModifyDate|MetadataDate|DateTimeOriginal|DateCreated)"
+    r"""(?:=["']([^"']+)["']|>([^<]+)<)"""
+)
+
+
+def _to_epoch_us(year, month, day, hour=0, minute=0, second=0, fraction="", offset_minutes=0):
+    moment = datetime(
+        int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0),
+        int((fraction or "0")[:6].ljust(6, "0")),
+        tzinfo=timezone(timedelta(minutes=offset_minutes))
+    )
+    return (moment - EPOCH) // ONE_MICROSECOND
+
+
+def _offset_minutes(text):
+    if not text or text.upper() in ("Z", "UTC"):
+        return 0
+    match = _OFFSET.match(text.strip())
+    if not match:
+        raise ValueError(f"Bad UTC offset: {text}")
+    minutes = int(match.group(2)) * 60 + int(match.group(3))
+    return -minutes if match.group(1) == "-" else minutes
+
+
+def parse_pdf_date(value):
+    """D:YYYYMMDDHHmmSSOHH'mm' -> (epoch_us, tz_assumed), or None."""
+    match = _PDF_DATE.match(value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, sign, off_hours, off_minutes = match.groups()
+    offset = 0
+    if sign in ("+", "-"):
+        offset = int(off_hours or 0) * 60 + int(off_minutes or 0)
+        offset = -offset if sign == "-" else offset
+    return _to_epoch_us(year, month, day, hour, minute, second, offset_minutes=offset), sign is None
+
+
+def parse_exif_date(value, offset=None):
+    """YYYY:MM:DD HH:MM:SS with an optional OffsetTime* value -> (epoch_us, tz_assumed), or None."""
+    match = _EXIF_DATE.match(value.strip())
+    if not match or match.group(1) == "0000":
+        return None
+    year, month, day, hour, minute, second, fraction, inline_offset = match.groups()
+    zone = inline_offset or (offset.strip() if isinstance(offset, str) and offset.strip() else None)
+    epoch_us = _to_epoch_us(year, month, day, hour, minute, second, fraction, _offset_minutes(zone))
+    return epoch_us, zone is None
+
+
+def parse_iso_date(value):
+    """ISO 8601 / ffprobe / MediaInfo ("UTC 2023-06-15 12:30:00") -> (epoch_us, tz_assumed), or None."""
+    text = value.strip()
+    zone = None
+    if text.upper().startswith("UTC "):
+        text, zone = text[4:], "UTC"
+    match = _ISO_DATE.match(text)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, inline_zone = match.groups()
+    zone = inline_zone or zone
+    epoch_us = _to_epoch_us(year, month, day, hour, minute, second, fraction, _offset_minutes(zone))
+    return epoch_us, zone is None
+
+
+def parse_timestamp(value, offset=None):
+    """
+    Normalize any timestamp the handlers produce to (epoch_us, tz_assumed).
+    Numbers are taken as epoch seconds. Returns None for anything unparseable.
+    """
+    try:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return int(round(value * 1_000_000)), False
+        if isinstance(value, bytes):
+            value = value.decode("latin-1")
+        if not isinstance(value, str) or not value.strip():
+            return None
+        text = value.strip()
+        if text.startswith("D:") or re.match(r"^\d{14}", text):
+            return parse_pdf_date(text)
+        if _EXIF_DATE.match(text):
+            return parse_exif_date(text, offset)
+        return parse_iso_date(text)
+    except (ValueError, OverflowError):
+        return None
+
+
+def format_utc(epoch_us):
+    return (EPOCH + timedelta(microseconds=epoch_us)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _gps_timestamp(gps_tags):
+    date = gps_tags.get("GPSDateStamp")
+    time_stamp = gps_tags.get("GPSTimeStamp")
+    if not isinstance(date, str) or not time_stamp:
+        return None
+    try:
+        hours, minutes, seconds = (float(part) for part in time_stamp)
+    except (TypeError, ValueError):
+        return None
+    whole = int(seconds)
+    return f"{date.strip()} {int(hours):02d}:{int(minutes):02d}:{whole:02d}.{int(round((seconds - whole) * 1e6)):06d}Z"
+
+
+def extract_events(file_path, kind, result, stat=None):
+    """
+    Collect normalized timeline events from an analyze_file() result.
+
+    stat should be taken before anything read the file. A stat taken after
+    hashing records IMAZER's own read as the access time.
+
+    Returns [{"utc", "epoch_us", "artifact", "field", "raw", "tz_assumed"}]
+    sorted by time.
+    """
+    events = []
+
+    def add(artifact, field, value, offset=None):
+        parsed = parse_timestamp(value, offset)
+        if parsed is not None:
+            events.append({
+                "utc": format_utc(parsed[0]),
+                "epoch_us": parsed[0],
+                "artifact": artifact,
+                "field": field,
+                "raw": str(value),
+                "tz_assumed": parsed[1],
+            })
+
+    if not isinstance(result, dict):
+        return events
+
+    try:
+        stat = stat or os.stat(file_path)
+        add("filesystem", "mtime", stat.st_mtime)
+        add("filesystem", "atime", stat.st_atime)
+        add("filesystem", "ctime", stat.st_ctime)
+    except OSError:
+        # Fall back to what the audio handler recorded
+        file_info = result.get("file_info") or {}
+        for field, key in (("mtime", "modified_utc"), ("atime", "accessed_utc"), ("ctime", "created_utc")):
+            if file_info.get(key):
+                add("filesystem", field, file_info[key])
+
+    if kind == "audio":
+        tracks = [("general", result.get("technical_metadata") or {})]
+        tracks += [(f"audio{i}", track) for i, track in enumerate(result.get("audio_tracks") or [])]
+        for prefix, track in tracks:
+            for key, value in track.items():
+                # *_local repeats the same instant in local time
+                if "date" in key and not key.endswith("_local") and isinstance(value, str):
+                    add("mediainfo", f"{prefix}.{key}", value)
+
+    elif kind == "image":
+        exif = result.get("exif") or {}
+        for tag, offset_tag in EXIF_DATE_TAGS.items():
+            if tag in exif:
+                add("exif", tag, exif[tag], exif.get(offset_tag))
+        gps_tags = (result.get("geolocation") or {}).get("gps_tags") or {}
+        gps_time = _gps_timestamp(gps_tags)
+        if gps_time:
+            add("exif", "GPSDateTime", gps_time)
+        xmp = result.get("xmp")
+        if isinstance(xmp, str):
+            for match in _XMP_DATE.finditer(xmp):
+                add("xmp", f"{match.group(1)}:{match.group(2)}", match.group(3) or match.group(4))
+
+    elif kind == "pdf":
+        info = result.get("metadata") or {}
+        # Found by the structural scan too, the only source when triage skipped pdfminer
+        raw_info = (result.get("structure") or {}).get("info_dates") or {}
+        for key in PDF_DATE_KEYS:
+            value = info.get(key) or raw_info.get(key)
+            if value:
+                add("pdf_info", key, value)
+
+    elif kind == "video":
+        sections = [("format", (result.get("format") or {}).get("tags") or {})]
+        sections += [
+            (f"stream{stream.get('index', i)}", stream.get("tags") or {})
+            for i, stream in enumerate(result.get("streams") or [])
+        ]
+        for prefix, tags in sections:
+            for key, value in tags.items():
+                if "creation_time" in key or "date" in key.lower():
+                    add("ffprobe", f"{prefix}.{key}", value)
+
+    events.sort(key=lambda event: event["epoch_us"])
+    return events
+
+
+class TimelineStore:
+    """SQLite event store with clustered time-range and per-file lookups."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-65536;
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                kind TEXT
+            );
+            CREATE TABLE IF NOT EXISTS labels (
+                id INTEGER PRIMARY KEY,
+                artifact TEXT NOT NULL,
+                field TEXT NOT NULL,
+                UNIQUE (artifact, field)
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                ts INTEGER NOT NULL,
+                source_id INTEGER NOT NULL,
+                label_id INTEGER NOT NULL,
+                raw TEXT,
+                tz_assumed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (ts, source_id, label_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS events_by_source ON events (source_id, ts);
+        """)
+        self._sources = {}
+        self._labels = {row[1:]: row[0] for row in self.conn.execute("SELECT id, artifact, field FROM labels")}
+
+    def _source_id(self, path, kind=None):
+        source_id = self._sources.get(path)
+        if source_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO sources (path, kind) VALUES (?, ?)", (path, kind))
+            source_id = self._sources[path] = self.conn.execute(
+                "SELECT id FROM sources WHERE path = ?", (path,)
+            ).fetchone()[0]
+        return source_id
+
+    def _label_id(self, artifact, field):
+        label_id = self._labels.get((artifact, field))
+        if label_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO labels (artifact, field) VALUES (?, ?)", (artifact, field))
+            label_id = self._labels[(artifact, field)] = self.conn.execute(
+                "SELECT id FROM labels WHERE artifact = ? AND field = ?", (artifact, field)
+            ).fetchone()[0]
+        return label_id
+
+    def add(self, path, kind, events):
+        self.add_many([(path, kind, events)])
+
+    def add_many(self, entries, batch_size=100000):
+        """
+        Insert (path, kind, events) entries, events as produced by
+        extract_events(). Rows are sorted per batch so the clustered B-tree
+        is filled in order.
+        """
+        batch = []
+        with self.conn:
+            for path, kind, events in entries:
+                source_id = self._source_id(os.path.abspath(path), kind)
+                for event in events:
+                    batch.append((
+                        event["epoch_us"], source_id, self._label_id(event["artifact"], event["field"]),
+                        event.get("raw"), int(bool(event.get("tz_assumed")))
+                    ))
+                if len(batch) >= batch_size:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+
+    def _insert(self, rows):
+        rows.sort()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO events (ts, source_id, label_id, raw, tz_assumed) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def query(self, start=None, end=None, source=None, artifacts=None, limit=None):
+        """
+        Yield events in time order, start <= epoch_us < end, optionally for
+        one file (source path) and/or a set of artifacts.
+        """
+        conditions = []
+        params = []
+        if source is not None:
+            row = self.conn.execute("SELECT id FROM sources WHERE path = ?", (os.path.abspath(source),)).fetchone()
+            if row is None:
+                return
+            conditions.append("e.source_id = ?")
+            params.append(row[0])
+        if start is not None:
+            conditions.append("e.ts >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("e.ts < ?")
+            params.append(end)
+        if artifacts:
+            conditions.append(f"l.artifact IN ({','.join('?' * len(artifacts))})")
+            params.extend(artifacts)
+        sql = (
+            "SELECT e.ts, s.path, s.kind, l.artifact, l.field, e.raw, e.tz_assumed "
+            "FROM events e JOIN sources s ON s.id = e.source_id JOIN labels l ON l.id = e.label_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY e.ts"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        for ts, path, kind, artifact, field, raw, tz_assumed in self.conn.execute(sql, params):
+            yield {
+                "utc": format_utc(ts),
+                "epoch_us": ts,
+                "source": path,
+                "kind": kind,
+                "artifact": artifact,
+                "field": field,
+                "raw": raw,
+                "tz_assumed": bool(tz_assumed),
+            }
+
+    def sources(self):
+        """Per-file event counts and first/last event times."""
+        return [
+            {"path": path, "kind": kind, "events": count,
+             "first": format_utc(first) if first is not None else None,
+             "last": format_utc(last) if last is not None else None}
+            for path, kind, count, first, last in self.conn.execute(
+                "SELECT s.path, s.kind, COUNT(e.ts), MIN(e.ts), MAX(e.ts) "
+                "FROM sources s LEFT JOIN events e ON e.source_id = s.id GROUP BY s.id ORDER BY s.path"
+            )
+        ]
+
+    def export(self, output_path, fmt="csv", **filters):
+        """
+        Write a super-timeline of the (filtered) events and return the count.
+        csv has one column per field, tln is the five-field
+        Time|Source|Host|User|Description format, ndjson one event per line.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported timeline format: {fmt}")
+        written = 0
+        if fmt == "ndjson":
+            from handlers.output import NDJSONWriter
+            with NDJSONWriter(output_path) as writer:
+                for event in self.query(**filters):
+                    writer.write(event)
+                    written += 1
+            return written
+        out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8", newline="")
+        try:
+            if fmt == "csv":
+                writer = csv.writer(out)
+                writer.writerow(CSV_COLUMNS)
+                for event in self.query(**filters):
+                    writer.writerow([event[column] for column in CSV_COLUMNS])
+                    written += 1
+            else:
+                for event in self.query(**filters):
+                    description = f"{event['field']} {event['raw']} {event['source']}".replace("|", "/")
+                    assumed = " (timezone assumed UTC)" if event["tz_assumed"] else ""
+                    out.write(f"{event['epoch_us'] // 1_000_000}|{event['artifact'].upper()}|||{description}{assumed}\n")
+                    written += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return written
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_bound(text):
+    """CLI time bound: epoch seconds or any timestamp parse_timestamp() accepts (UTC if no zone)."""
+    if text is None:
+        return None
+    try:
+        return int(float(text) * 1_000_000)
+    except ValueError:
+        pass
+    parsed = parse_timestamp(text)
+    if parsed is None:
+        raise ValueError(f"Unrecognized time: {text}")
+    return parsed[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Query or export an IMAZER timeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ("query", "export"):
+        command = subparsers.add_parser(name)
+        command.add_argument("store")
+        if name == "export":
+            command.add_argument("output", help="output file, - for stdout")
+            command.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        command.add_argument("--start", help="epoch seconds or timestamp (inclusive)")
+        command.add_argument("--end", help="epoch seconds or timestamp (exclusive)")
+        command.add_argument("--source", help="only events of this file")
+        command.add_argument("--artifact", action="append", help="filesystem, exif, xmp, pdf_info, mediainfo, ffprobe")
+        command.add_argument("--limit", type=int)
+    subparsers.add_parser("sources").add_argument("store")
+    args = parser.parse_args()
+
+    store = TimelineStore(args.store)
+    if args.command == "sources":
+        for entry in store.sources():
+            print(json.dumps(entry))
+    else:
+        filters = {"start": parse_bound(args.start), "end": parse_bound(args.end), "source": args.source,
+                   "artifacts": args.artifact, "limit": args.limit}
+        if args.command == "query":
+            for event in store.query(**filters):
+                print(json.dumps(event))
+        else:
+            count = store.export(args.output, args.format, **filters)
+            print(f"Wrote {count} events to {args.output}", file=sys.stderr)
+    store.close()
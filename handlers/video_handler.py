@@ -1,7 +1,13 @@
+import json
 import os
+import subprocess
 from typing import Optional
 from tkinter import Tk, filedialog
 import ffmpeg
+from handlers import metrics
+
+# ffprobe can stall on a corrupt container, never wait on it forever
+FFPROBE_TIMEOUT = 30
 
 def select_video_file() -> Optional[str]:
     """Open a file dialog to select a video file."""
@@ -17,10 +23,28 @@ def select_video_file() -> Optional[str]:
             return file_path
         print("Invalid file selection. Please try again.")
 
+def probe_video(file_path: str, timeout: Optional[float] = FFPROBE_TIMEOUT) -> dict:
+    """
+    Run ffprobe on a video file and return its format and stream data.
+
+    Same command as ffmpeg.probe(), which has no wall-clock limit of its own.
+    A probe that runs past timeout is killed and reported as an ffmpeg.Error.
+    """
+    args = ['ffprobe', '-show_format', '-show_streams', '-of', 'json', file_path]
+    with metrics.subprocess_wait('ffprobe'):
+        try:
+            # run() kills ffprobe before re-raising TimeoutExpired
+            completed = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            raise ffmpeg.Error('ffprobe', e.stdout or b'', f"ffprobe timed out after {timeout} s".encode())
+    if completed.returncode != 0:
+        raise ffmpeg.Error('ffprobe', completed.stdout, completed.stderr)
+    return json.loads(completed.stdout.decode('utf-8'))
+
 def extract_video_metadata(file_path: str):
     """Extract detailed metadata from a video file."""
     try:
-        metadata = ffmpeg.probe(file_path)
+        metadata = probe_video(file_path)
         streams = metadata.get('streams', [])
         format_info = metadata.get('format', {})
 
@@ -1,14 +1,19 @@
 
 
 import time
+
+# Taken before anything else is imported so --startup-time covers module setup
+_STARTUP = time.perf_counter()
+
 import sys
 import os
-import requests
 import json
+import threading
 
 # --- UPDATE LOGIC ---
 # IMPORTANT: You need to install the 'requests' library for this to work.
-# Run 'pip install requests' in your terminal.
+# Run 'pip install requests' in your terminal. It is only imported when a
+# version check actually goes to the network.
 
 # Define the current version of the script
 VERSION = "1.0.0"
@@ -18,25 +23,86 @@ VERSION = "1.0.0"
 GITHUB_VERSION_URL = "https://raw.githubusercontent.com/bablerpaul/IMAZER/refs/heads/main/latest_version.txt"
 GITHUB_REPO_URL = "https://github.com/bablerpaul/IMAZER"
 
-def check_for_updates():
-    """Checks for a new version of the script on GitHub."""
-    print("Checking for updates...")
+# The last answer from GitHub is cached on disk. A successful check is reused
+# for a day, a failed one (offline workstation) suppresses retries for an hour.
+UPDATE_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".imazer_update_check.json")
+UPDATE_CHECK_TTL = 24 * 3600
+UPDATE_FAILURE_TTL = 3600
+# Set IMAZER_NO_UPDATE_CHECK=1 (or pass --no-update-check) to never go online
+UPDATE_CHECK_DISABLED = os.environ.get("IMAZER_NO_UPDATE_CHECK", "") not in ("", "0")
+
+# Filled in by the background check, shown under the menu once available
+update_notice = None
+
+
+def _read_update_cache():
+    try:
+        with open(UPDATE_CACHE_FILE, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    ttl = UPDATE_CHECK_TTL if cache.get("latest_version") else UPDATE_FAILURE_TTL
+    if time.time() - cache.get("checked_at", 0) > ttl:
+        return None
+    return cache
+
+
+def _write_update_cache(latest_version, error=None):
+    try:
+        with open(UPDATE_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"checked_at": time.time(), "latest_version": latest_version, "error": error}, f)
+    except OSError:
+        pass
+
+
+def get_latest_version():
+    """Return (latest_version, error), from the TTL cache when it is fresh."""
+    cache = _read_update_cache()
+    if cache is not None:
+        return cache.get("latest_version"), cache.get("error")
+
+    import requests
+
     try:
         response = requests.get(GITHUB_VERSION_URL, timeout=5)
         response.raise_for_status()  # Raise an exception for bad status codes
         latest_version = response.text.strip()
-        
-        # Simple version comparison
-        if latest_version != VERSION:
-            print(f"\n--- A new version ({latest_version}) is available! ---")
-            print(f"Your current version is {VERSION}.")
-            print(f"Please download the latest version from: {GITHUB_REPO_URL}")
-        else:
-            print("You are running the latest version.")
-            
+        _write_update_cache(latest_version)
+        return latest_version, None
     except requests.exceptions.RequestException as e:
-        print(f"Could not check for updates. Error: {e}")
-    print("-" * 35)
+        _write_update_cache(None, str(e))
+        return None, str(e)
+
+
+def format_update_notice(latest_version, error):
+    if error:
+        return f"Could not check for updates. Error: {error}"
+    # Simple version comparison
+    if latest_version != VERSION:
+        return (f"--- A new version ({latest_version}) is available! ---\n"
+                f"Your current version is {VERSION}.\n"
+                f"Please download the latest version from: {GITHUB_REPO_URL}")
+    return "You are running the latest version."
+
+
+def start_update_check():
+    """Run the version check on a daemon thread so the menu never waits for the network."""
+    if UPDATE_CHECK_DISABLED:
+        return None
+
+    def worker():
+        global update_notice
+        try:
+            latest_version, error = get_latest_version()
+        except ImportError:
+            return
+        # Offline failures are not worth interrupting the menu for
+        if not error and latest_version != VERSION:
+            update_notice = format_update_notice(latest_version, error)
+
+    thread = threading.Thread(target=worker, name="imazer-update-check", daemon=True)
+    thread.start()
+    return thread
 
 # --- END OF UPDATE LOGIC ---
 
@@ -48,7 +114,11 @@ RESET = "\033[0m"
 
 # Clear screen function
 def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if os.name == 'nt':
+        os.system('cls')
+    else:
+        # ANSI clear instead of spawning `clear`, which costs a fork per menu draw
+        print("\033[H\033[2J", end="", flush=True)
 
 # Animation frames with moving legs
 frames = [
@@ -122,71 +192,257 @@ def display_menu():
     print(f"{MIDNIGHT_BLUE}  4. audio analyzer{RESET}")
     print(f"{MIDNIGHT_BLUE}  5. exit from tool{RESET}")
     print(f"{MIDNIGHT_BLUE}  {'*' * 35}{RESET}")
+    if update_notice:
+        print(f"\n{update_notice}")
     print("\n")
 
-# Main program loop
-# The update check will happen before the first menu display
-check_for_updates()
 
-while True:
+def run_batch(paths, slow_lane=False, timeout=None, max_memory_mb=None, max_file_size_mb=None,
+              output="-", compression=None, rotate_mb=None, fuzzy_index=None,
+              known_indexes=(), skip_known=False, pdf_triage=False, timeline=None, hash_all=False):
+    """
+    Analyze files non-interactively, each under its handler's time and memory
+    budget, writing one compact NDJSON record per file as soon as it finishes.
+    With timeline, every file's events are appended to that TimelineStore.
+    """
+    from handlers import metrics
+    from handlers.analyze import analyze_file, detect_kind
+    from handlers.budget import read_quarantine, release_quarantine
+    from handlers.output import NDJSONWriter
+
+    jobs = [(path, None) for path in paths]
+    if slow_lane and not jobs:
+        jobs = read_quarantine()
+    rotate_bytes = int(rotate_mb * 1024 * 1024) if rotate_mb else None
+    index = None
+    if fuzzy_index:
+        from handlers.fuzzy_hash import FuzzyIndex
+        index = FuzzyIndex(fuzzy_index)
+    store = None
+    if timeline:
+        from handlers.timeline import TimelineStore
+        store = TimelineStore(timeline)
+    released = []
+    with NDJSONWriter(output, compression=compression, rotate_bytes=rotate_bytes) as writer:
+        for path, kind in jobs:
+            result = analyze_file(
+                path, kind=kind, slow_lane=slow_lane, timeout=timeout,
+                max_memory_mb=max_memory_mb, max_file_size_mb=max_file_size_mb,
+                known_indexes=known_indexes, skip_known=skip_known, pdf_triage=pdf_triage,
+                fuzzy=True if index is not None else None, hash_all=hash_all
+            )
+            with metrics.span("output"):
+                writer.write({"file": path, "result": result})
+            budget_error = result.get("budget_error")
+            if slow_lane and (not budget_error or budget_error["type"] == "exception"):
+                # Done with, or beyond what a bigger budget can fix
+                released.append(path)
+            digest = result.get("hashes", {}).get("ssdeep")
+            if index is not None and digest:
+                with metrics.span("fuzzy_index"):
+                    index.add(os.path.abspath(path), digest)
+            if store is not None and result.get("timeline"):
+                with metrics.span("timeline_store"):
+                    store.add(path, kind or detect_kind(path), result["timeline"])
+            metrics.export(force=False)
+    if index is not None:
+        index.close()
+    if store is not None:
+        store.close()
+    if released:
+        release_quarantine(released)
+    metrics.export()
+
+
+def find_similar(paths, fuzzy_index, threshold=1):
+    """Fuzzy-hash each path and list similar files already in the index."""
+    from handlers.fuzzy_hash import FuzzyIndex
+    from handlers.hashing import calculate_forensic_hashes
+    from handlers.output import NDJSONWriter
+
+    index = FuzzyIndex(fuzzy_index)
+    with NDJSONWriter() as writer:
+        for path in paths:
+            digest = calculate_forensic_hashes(path, fuzzy=True).get("ssdeep")
+            matches = index.search(digest, threshold) if digest else []
+            writer.write({"file": path, "ssdeep": digest, "matches": matches})
+    index.close()
+
+
+def measure_startup():
+    """Render the menu once, report time-to-menu and exit without prompting."""
     display_menu()
-    n = input("Enter your choice: ")
+    elapsed_ms = (time.perf_counter() - _STARTUP) * 1000
+    heavy = [name for name in ("requests", "pdfminer", "PIL", "pymediainfo", "ffmpeg") if name in sys.modules]
+    print(f"Time to menu: {elapsed_ms:.1f} ms (from main.py start, interpreter startup excluded)")
+    print(f"Heavy modules imported before the menu: {', '.join(heavy) or 'none'}")
 
-    if n == "1":
-        print("Image analyzer tool launching.....")
-        try:
-            from handlers.image_handler import image_handler
-            image_handler()
-        except ImportError:
-            print("Error: Could not import 'image_handler'. Make sure the 'handlers' directory and files are in the correct location.")
-        input("\nPress Enter to return to main menu...")
 
-    elif n == "2":
-        print("PDF analyzer tool launching...")
-        try:
-            from handlers.pdf_handler import PDF_Handler
-            pdf_path = input("Enter PDF file path: ")
-            if pdf_path:
-                handler = PDF_Handler(pdf_path)
-                handler.analyze()
-                handler.print_results()
-            else:
-                print("No PDF file selected.")
-        except ImportError:
-            print("Error: Could not import 'PDF_Handler'. Make sure the 'handlers' directory and files are in the correct location.")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        input("\nPress Enter to return to main menu...")
+# Main program loop
+def run_menu():
+    # The update check runs in the background while the menu is shown
+    start_update_check()
 
-    elif n == "3":
-        print("Video analyzer tool launching...")
-        try:
-            from handlers.video_handler import video_handler
-            video_handler()
-        except ImportError:
-            print("Error: Could not import 'video_handler'. Make sure the 'handlers' directory and files are in the correct location.")
-        input("\nPress Enter to return to main menu...")
+    while True:
+        display_menu()
+        n = input("Enter your choice: ")
 
-    elif n == "4":
-        print("Audio analyzer tool launching...")
-        try:
-            from handlers.audio_handler import audio_handler
-            audio_path = input("Enter audio file path: ")
-            if audio_path:
-                result = audio_handler(audio_path)
-                print(json.dumps(result, indent=2, ensure_ascii=False))
-            else:
-                print("No audio file selected.")
-        except ImportError:
-            print("Error: Could not import 'audio_handler'. Make sure the 'handlers' directory and files are in the correct location.")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        input("\nPress Enter to return to main menu...")
+        if n == "1":
+            print("Image analyzer tool launching.....")
+            try:
+                from handlers.image_handler import image_handler
+                image_handler()
+            except ImportError:
+                print("Error: Could not import 'image_handler'. Make sure the 'handlers' directory and files are in the correct location.")
+            input("\nPress Enter to return to main menu...")
 
-    elif n == "5":
-        print("Exited successfully, have a good day!")
-        break
+        elif n == "2":
+            print("PDF analyzer tool launching...")
+            try:
+                from handlers.pdf_handler import PDF_Handler
+                pdf_path = input("Enter PDF file path: ")
+                if pdf_path:
+                    handler = PDF_Handler(pdf_path)
+                    handler.analyze()
+                    handler.print_results()
+                else:
+                    print("No PDF file selected.")
+            except ImportError:
+                print("Error: Could not import 'PDF_Handler'. Make sure the 'handlers' directory and files are in the correct location.")
+            except Exception as e:
+                print(f"An error occurred: {e}")
+            input("\nPress Enter to return to main menu...")
 
+        elif n == "3":
+            print("Video analyzer tool launching...")
+            try:
+                from handlers.video_handler import video_handler
+                video_handler()
+            except ImportError:
+                print("Error: Could not import 'video_handler'. Make sure the 'handlers' directory and files are in the correct location.")
+            input("\nPress Enter to return to main menu...")
+
+        elif n == "4":
+            print("Audio analyzer tool launching...")
+            try:
+                from handlers.audio_handler import audio_handler
+                audio_path = input("Enter audio file path: ")
+                if audio_path:
+                    result = audio_handler(audio_path)
+                    print(json.dumps(result, indent=2, ensure_ascii=False))
+                else:
+                    print("No audio file selected.")
+            except ImportError:
+                print("Error: Could not import 'audio_handler'. Make sure the 'handlers' directory and files are in the correct location.")
+            except Exception as e:
+                print(f"An error occurred: {e}")
+            input("\nPress Enter to return to main menu...")
+
+        elif n == "5":
+            print("Exited successfully, have a good day!")
+            break
+
+        else:
+            print("Invalid choice. Please enter a number from 1 to 5.")
+            time.sleep(1.5)
+
+
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="IMAZER forensic metadata extractor")
+    parser.add_argument("paths", nargs="*", help="files to analyze in batch mode (no menu)")
+    parser.add_argument("--slow-lane", action="store_true",
+                        help="retry with relaxed budgets; without paths, reprocess quarantined files")
+    parser.add_argument("--timeout", type=float, help="per-file wall-clock budget in seconds")
+    parser.add_argument("--max-memory-mb", type=float, help="per-file worker memory budget")
+    parser.add_argument("--max-file-size-mb", type=float, help="skip files larger than this")
+    parser.add_argument("--output", default="-", help="NDJSON results file for batch mode (default stdout)")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="compress the results file")
+    parser.add_argument("--rotate-mb", type=float, help="start a new numbered results file after this many MB")
+    parser.add_argument("--fuzzy-index", help="SQLite file that batch mode adds ssdeep digests to")
+    parser.add_argument("--find-similar", action="store_true",
+                        help="look the given files up in --fuzzy-index instead of analyzing them")
+    parser.add_argument("--threshold", type=int, default=1, help="minimum ssdeep score for --find-similar")
+    parser.add_argument("--known-hashes", action="append", default=[],
+                        help="known-hash index built with handlers.known_hashes (repeatable)")
+    parser.add_argument("--skip-known", action="store_true",
+                        help="do not run handlers on files found as known-good")
+    parser.add_argument("--pdf-triage", action="store_true",
+                        help="run the full PDF analysis only on files the structural scan flags")
+    parser.add_argument("--hash-all", action="store_true",
+                        help="hash image, PDF and video files too (audio is always hashed)")
+    parser.add_argument("--timeline", help="SQLite store that batch mode appends timeline events to")
+    parser.add_argument("--daemon", action="store_true",
+                        help="serve analysis jobs over a local socket with warm handlers")
+    parser.add_argument("--socket", help="daemon socket path (default /tmp/imazer.sock); "
+                                         "with paths, submit them to a running daemon")
+    parser.add_argument("--workers", type=int, help="daemon worker threads")
+    parser.add_argument("--stats", action="store_true", help="print a running daemon's queue stats")
+    parser.add_argument("--metrics-json", help="write per-stage timings and counters as a JSON summary")
+    parser.add_argument("--metrics-prom", help="write metrics in Prometheus text format (textfile collector)")
+    parser.add_argument("--profile-rate", type=float, default=0.0,
+                        help="fraction of files to run under cProfile (implies metrics)")
+    parser.add_argument("--tracemalloc-rate", type=float, default=0.0,
+                        help="fraction of files to trace with tracemalloc (implies metrics)")
+    parser.add_argument("--profile-dir", default="imazer_profiles", help="where sampled .prof files go")
+    parser.add_argument("--no-update-check", action="store_true", help="never contact GitHub for updates")
+    parser.add_argument("--startup-time", action="store_true", help="report time-to-menu and exit")
+    args = parser.parse_args()
+    if args.find_similar and not args.fuzzy_index:
+        parser.error("--find-similar requires --fuzzy-index")
+    return args
+
+
+def run_daemon_client(paths, address, stats=False, output="-", compression=None, rotate_mb=None, timeline=None):
+    from handlers.daemon import daemon_stats, submit_files
+    from handlers.output import NDJSONWriter
+    from handlers.timeline import TimelineStore
+
+    if stats:
+        print(json.dumps(daemon_stats(address), indent=2))
+    if not paths:
+        return
+    rotate_bytes = int(rotate_mb * 1024 * 1024) if rotate_mb else None
+    store = TimelineStore(timeline) if timeline else None
+    with NDJSONWriter(output, compression=compression, rotate_bytes=rotate_bytes) as writer:
+        for record in submit_files(paths, address):
+            writer.write(record)
+            events = (record.get("result") or {}).get("timeline")
+            if store is not None and events:
+                store.add(record["file"], record.get("kind"), events)
+    if store is not None:
+        store.close()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.no_update_check:
+        UPDATE_CHECK_DISABLED = True
+    if args.metrics_json or args.metrics_prom or args.profile_rate or args.tracemalloc_rate:
+        from handlers import metrics
+        metrics.enable(args.metrics_json, args.metrics_prom, args.profile_rate,
+                       args.tracemalloc_rate, args.profile_dir)
+    if args.startup_time:
+        start_update_check()
+        measure_startup()
+    elif args.find_similar:
+        find_similar(args.paths, args.fuzzy_index, args.threshold)
+    elif args.daemon:
+        from handlers.daemon import DEFAULT_WORKERS, serve
+        try:
+            serve(args.socket, workers=args.workers or DEFAULT_WORKERS,
+                  known_indexes=args.known_hashes, skip_known=args.skip_known, pdf_triage=args.pdf_triage,
+                  hash_all=args.hash_all)
+        except OSError as e:
+            raise SystemExit(f"Cannot start the daemon: {str(e)}")
+    elif args.socket or args.stats:
+        from handlers.daemon import DEFAULT_SOCKET
+        run_daemon_client(args.paths, args.socket or DEFAULT_SOCKET, args.stats,
+                          args.output, args.compress, args.rotate_mb, args.timeline)
+    elif args.paths or args.slow_lane:
+        run_batch(args.paths, args.slow_lane, args.timeout, args.max_memory_mb, args.max_file_size_mb,
+                  args.output, args.compress, args.rotate_mb, args.fuzzy_index,
+                  args.known_hashes, args.skip_known, args.pdf_triage, args.timeline, args.hash_all)
     else:
-        print("Invalid choice. Please enter a number from 1 to 5.")
-        time.sleep(1.5)
+        run_menu()
@@ -0,0 +1,48 @@
+import json
+
+from benchmarks import bench
+from benchmarks.bench import compare, load_corpus, percentile
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([4, 1, 3, 2], 0.5) == 2.5
+    assert percentile([1, 2, 3], 1.0) == 3
+
+
+def test_manifest_paths_resolve_against_the_corpus_directory(tmp_path, monkeypatch):
+    corpus = tmp_path / "moved_corpus"
+    corpus.mkdir()
+    (corpus / "report_1p.pdf").write_bytes(b"%PDF-1.4\n")
+    (corpus / "manifest.json").write_text(json.dumps({
+        "seed": 1, "files": [{"path": "report_1p.pdf", "kind": "pdf", "size": 9}], "skipped": [],
+    }))
+    monkeypatch.chdir(tmp_path)
+
+    def regenerate(*args):
+        raise AssertionError("corpus was regenerated")
+
+    monkeypatch.setattr(bench, "generate_corpus", regenerate)
+    files, skipped = load_corpus(str(corpus), seed=1)
+    assert files == [{"path": str(corpus / "report_1p.pdf"), "kind": "pdf", "size": 9}]
+
+
+def test_stale_corpus_is_regenerated(tmp_path, monkeypatch):
+    (tmp_path / "manifest.json").write_text(json.dumps({
+        "seed": 1, "files": [{"path": "gone.wav", "kind": "audio", "size": 9}],
+    }))
+    monkeypatch.setattr(bench, "generate_corpus", lambda directory, seed: (["new"], []))
+    assert load_corpus(str(tmp_path), seed=1) == (["new"], [])
+
+
+def test_compare_flags_regressions_only_beyond_tolerance():
+    def report(mb_per_s, p90, rss):
+        return {
+            "environment": {}, "corpus": {"seed": 1},
+            "stages": {"hashes": {"status": "ok", "mb_per_s": mb_per_s, "latency_ms": {"p90": p90},
+                                  "peak_rss_mb": rss}},
+        }
+    baseline = report(100.0, 10.0, 50.0)
+    assert compare(report(90.0, 11.0, 55.0), baseline, tolerance=0.2) == ([], [])
+    regressions, _ = compare(report(70.0, 13.0, 80.0), baseline, tolerance=0.2)
+    assert len(regressions) == 3
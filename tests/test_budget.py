@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from handlers import budget
+from handlers.budget import read_quarantine, release_quarantine, report_partial, run_with_budget
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="worker tests fork")
+
+
+def succeed(file_path):
+    report_partial("hashes", {"md5": "x"})
+    return {"file": os.path.basename(file_path)}
+
+
+def hang(file_path):
+    report_partial("hashes", {"md5": "x"})
+    time.sleep(30)
+
+
+def fail(file_path):
+    raise ValueError("bad header")
+
+
+def crash(file_path):
+    os._exit(3)
+
+
+def exhaust_memory(file_path):
+    return len(bytearray(8 * 1024 ** 3))
+
+
+def linger(file_path):
+    # A non-daemon thread keeps the worker from exiting after its result
+    threading.Thread(target=time.sleep, args=(30,)).start()
+    return {"file": file_path}
+
+
+@pytest.fixture
+def evidence(tmp_path):
+    path = tmp_path / "evidence.pdf"
+    path.write_bytes(b"%PDF-1.4\n" + b"0" * 4096)
+    return str(path)
+
+
+@pytest.fixture
+def quarantine_file(tmp_path):
+    return str(tmp_path / "quarantine.ndjson")
+
+
+def test_result_is_returned(evidence, quarantine_file):
+    assert run_with_budget(succeed, evidence, "pdf", quarantine_file=quarantine_file) == {"file": "evidence.pdf"}
+    assert read_quarantine(quarantine_file) == []
+
+
+def test_timeout_keeps_partial_results_and_quarantines(evidence, quarantine_file):
+    start = time.monotonic()
+    result = run_with_budget(hang, evidence, "pdf", quarantine_file=quarantine_file, timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert result["error"] == "Analysis timed out after 0.5s"
+    assert result["hashes"] == {"md5": "x"}
+    assert result["partial"] is True
+    assert result["budget_error"]["type"] == "timeout"
+    assert result["budget_error"]["quarantined"] is True
+    assert read_quarantine(quarantine_file) == [(evidence, "pdf")]
+
+
+def test_quarantine_record_has_a_utc_time(evidence, quarantine_file):
+    run_with_budget(crash, evidence, "pdf", quarantine_file=quarantine_file)
+    with open(quarantine_file, encoding="utf-8") as f:
+        record = json.loads(f.readline())
+    assert record["quarantined_utc"].endswith("Z")
+    assert (record["budget_error"]["type"], record["budget_error"]["exit_code"]) == ("crash", 3)
+
+
+def test_exceptions_are_not_quarantined(evidence, quarantine_file):
+    result = run_with_budget(fail, evidence, "pdf", quarantine_file=quarantine_file)
+    assert result["error"] == "Analysis failed: bad header"
+    assert "quarantined" not in result["budget_error"]
+    assert read_quarantine(quarantine_file) == []
+
+
+@pytest.mark.skipif(budget.resource is None, reason="needs rlimits")
+def test_memory_budget(evidence, quarantine_file):
+    result = run_with_budget(exhaust_memory, evidence, "pdf", quarantine_file=quarantine_file, max_memory_mb=2048)
+    assert result["budget_error"]["type"] == "memory"
+    assert result["error"] == "Analysis exceeded the 2048 MB memory budget"
+
+
+def test_oversize_files_never_start_a_worker(evidence, quarantine_file):
+    result = run_with_budget(crash, evidence, "pdf", quarantine_file=quarantine_file, max_file_size_mb=0.001)
+    assert result["budget_error"]["type"] == "oversize"
+    assert result["budget_error"]["file_size"] == os.path.getsize(evidence)
+
+
+def test_slow_lane_multiplies_limits_and_never_quarantines(evidence, quarantine_file):
+    assert budget.get_budget("pdf", slow_lane=True, timeout=2)["timeout"] == 2 * budget.SLOW_LANE_MULTIPLIER
+    result = run_with_budget(crash, evidence, "pdf", slow_lane=True, quarantine_file=quarantine_file)
+    assert result["budget_error"]["slow_lane"] is True
+    assert read_quarantine(quarantine_file) == []
+
+
+def test_lingering_worker_is_reaped(evidence, quarantine_file):
+    start = time.monotonic()
+    assert run_with_budget(linger, evidence, "pdf", quarantine_file=quarantine_file) == {"file": evidence}
+    assert time.monotonic() - start < budget.KILL_GRACE * 5
+
+
+def test_release_quarantine(tmp_path, quarantine_file):
+    paths = [str(tmp_path / name) for name in ("a.pdf", "b.pdf", "c.pdf")]
+    for path in paths + paths[:1]:
+        budget.quarantine(path, "pdf", {"type": "timeout"}, quarantine_file)
+    with open(quarantine_file, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    assert read_quarantine(quarantine_file) == [(path, "pdf") for path in paths]
+    release_quarantine(paths[:2], quarantine_file)
+    assert read_quarantine(quarantine_file) == [(paths[2], "pdf")]
+    with open(quarantine_file, encoding="utf-8") as f:
+        assert f.read().endswith("not json\n")
@@ -0,0 +1,97 @@
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from handlers import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+CLEAN_PDF = (
+    b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+    b"2 0 obj\n<< /Type /Pages /Kids [] /Count 0 >>\nendobj\n"
+    b"xref\n0 3\n0000000000 65535 f \n0000000009 00000 n \n0000000058 00000 n \n"
+    b"trailer\n<< /Size 3 /Root 1 0 R >>\nstartxref\n110\n%%EOF\n"
+)
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = daemon.AnalysisService(workers=2, budget=False, cache_size=8, pdf_triage=True)
+    path = str(tmp_path / "d.sock")
+    server = socketserver.ThreadingUnixStreamServer(path, daemon._JobHandler)
+    server.daemon_threads = True
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+
+def exchange(path, *lines):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(b"".join(line + b"\n" for line in lines))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("r", encoding="utf-8") as replies:
+            return [json.loads(line) for line in replies]
+
+
+def test_malformed_jobs_get_an_error_and_keep_the_connection(server):
+    replies = exchange(server, b"{not json", b"[1, 2]", b'"x"', b"42", b"", b'{"cmd": "stats"}')
+    assert replies[0]["error"].startswith("Invalid job: ")
+    assert [reply["error"] for reply in replies[1:4]] == ["Invalid job: expected an object"] * 3
+    assert replies[4]["stats"]["completed"] == 0
+
+
+def test_jobs_return_records_with_their_id(server, tmp_path):
+    pdf = tmp_path / "clean.pdf"
+    pdf.write_bytes(CLEAN_PDF)
+    jobs = [
+        json.dumps({"path": str(pdf), "id": 1}).encode(),
+        json.dumps({"path": str(tmp_path / "missing.pdf"), "id": 2}).encode(),
+    ]
+    records = {record["id"]: record for record in exchange(server, *jobs)}
+    assert records[1]["kind"] == "pdf"
+    assert "skipped" in records[1]["result"]
+    assert records[2]["result"] == {"error": "File not found"}
+
+
+def test_resubmitted_file_hits_the_cache(server, tmp_path):
+    pdf = tmp_path / "clean.pdf"
+    pdf.write_bytes(CLEAN_PDF)
+    job = json.dumps({"path": str(pdf)}).encode()
+    exchange(server, job)
+    exchange(server, job)
+    assert exchange(server, b'{"cmd": "stats"}')[0]["stats"]["cache_hits"] == 1
+
+
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / "stale.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.close()
+    daemon._remove_stale_socket(path)
+    assert not (tmp_path / "stale.sock").exists()
+
+
+def test_live_socket_is_left_alone(tmp_path):
+    path = str(tmp_path / "live.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen(1)
+        with pytest.raises(OSError, match="already listening"):
+            daemon._remove_stale_socket(path)
+    assert (tmp_path / "live.sock").exists()
+
+
+def test_other_files_are_never_unlinked(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("evidence")
+    with pytest.raises(OSError, match="not a socket"):
+        daemon._remove_stale_socket(str(path))
+    assert path.read_text() == "evidence"
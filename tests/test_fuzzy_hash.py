@@ -0,0 +1,113 @@
+import hashlib
+
+import pytest
+
+from handlers.fuzzy_hash import FuzzyIndex, _PurePythonHasher, _gram_keys, fuzzy_compare, fuzzy_hash
+
+
+def data(size):
+    """Deterministic incompressible bytes, the input the digests below were taken from."""
+    blocks = b"".join(hashlib.sha256(b"imazer" + i.to_bytes(4, "big")).digest() for i in range(size // 32 + 1))
+    return blocks[:size]
+
+
+# Reference digests from an independent spamsum implementation
+KNOWN_DIGESTS = [
+    (data(0), "3::"),
+    (data(1), "3:w:w"),
+    (data(100), "3:wrwlGxybGgdkBGYZgXcjZqupNLvqCLJQRusqaHt:wUlme9OhJZvqwJQRuZ2"),
+    (data(4096), "96:k04SYWSQani9KVKF5OrwjZJLq8/Ar3Sy8ojYhPLKj5YHedoOH+mL:kxQb4sx1JLq8/Xy8ojYh6jH+mL"),
+    (data(65536), "1536:wQRziE50PIYfbLKFddGYqv/eI3GJzq1Uvk2znnVJmci7/:1Rzii0PIuWdA/3aOlYbmci/"),
+    (data(300000), "6144:1RoIuHaKtcN1DwdUNhAvpwV9c1m62/3v2mbfFbwep3:1RQoHDwmNOvpwV61d2X2Iwu3"),
+    (b"The quick brown fox jumps over the lazy dog. " * 2000,
+     "12:Fg6666666666666666666666666666666666666666666666666666666666666x:F9"),
+]
+
+
+@pytest.mark.parametrize("content, expected", KNOWN_DIGESTS)
+def test_pure_python_digest_matches_spamsum(content, expected):
+    hasher = _PurePythonHasher(len(content))
+    hasher.update(content)
+    assert hasher.hexdigest() == expected
+
+
+def test_streaming_matches_one_shot():
+    content = data(65536)
+    hasher = _PurePythonHasher(len(content))
+    for offset in range(0, len(content), 1000):
+        hasher.update(content[offset:offset + 1000])
+    assert hasher.hexdigest() == fuzzy_hash(content)
+
+
+def test_compare_identical_and_unrelated():
+    digest = fuzzy_hash(data(65536))
+    assert fuzzy_compare(digest, digest) == 100
+    assert fuzzy_compare(digest, fuzzy_hash(data(300000))) == 0
+
+
+def test_compare_replace_costs_two():
+    # One replaced character in 16 + 16: distance 2 (ssdeep >= 2.13) scores 94,
+    # the older distance of 1 would score 97
+    assert fuzzy_compare("48:ABCDEFGHIJKLMNOP:aaa", "48:ABCDEFGHIJKLMNOQ:bbb") == 94
+
+
+def test_compare_caps_small_block_sizes():
+    assert fuzzy_compare("3:ABCDEFGHIJKLMNOP:aaa", "3:ABCDEFGHIJKLMNOQ:bbb") == 16
+
+
+def test_compare_needs_a_common_7gram():
+    assert fuzzy_compare("48:ABCDEFxabcdef:aaa", "48:ABCDEFyabcdef:bbb") == 0
+
+
+def test_compare_adjacent_block_sizes():
+    assert fuzzy_compare("48:xxx:ABCDEFGHIJKLMNOP", "96:ABCDEFGHIJKLMNOP:yyy") == 100
+    assert fuzzy_compare("48:ABCDEFGHIJKLMNOP:xxx", "192:ABCDEFGHIJKLMNOP:yyy") == 0
+
+
+def test_gram_keys_are_level_specific():
+    keys_48 = _gram_keys("48:ABCDEFGHIJ:KLMNOPQRST")
+    keys_96 = _gram_keys("96:KLMNOPQRST:UVWXYZabcd")
+    # The second signature of the 48 digest and the first of the 96 digest
+    # are the same block size, so they share keys
+    assert keys_48 & keys_96
+
+
+def test_short_signatures_get_a_key():
+    assert _gram_keys("3:abc:de")
+    assert _gram_keys("3:abc:de") == _gram_keys("3:abc:de")
+    assert not _gram_keys("3:abc:de") & _gram_keys("3:abd:df")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FuzzyIndex(str(tmp_path / "fuzzy.db"))
+    yield index
+    index.close()
+
+
+def test_index_finds_similar_files(index):
+    original = data(65536)
+    edited = original[:30000] + b"inserted by an editor" + original[30000:]
+    index.add_many([
+        ("/case/original.bin", fuzzy_hash(original)),
+        ("/case/unrelated.bin", fuzzy_hash(data(300000)[100000:165536])),
+    ])
+    matches = index.search(fuzzy_hash(edited))
+    assert [match["path"] for match in matches] == ["/case/original.bin"]
+    assert 0 < matches[0]["score"] < 100
+
+
+def test_index_matches_tiny_identical_files(index):
+    index.add("/case/tiny.txt", fuzzy_hash(b"hello world"))
+    index.add("/case/empty.txt", fuzzy_hash(b""))
+    assert [match["path"] for match in index.search(fuzzy_hash(b"hello world"))] == ["/case/tiny.txt"]
+    assert [match["path"] for match in index.search(fuzzy_hash(b""))] == ["/case/empty.txt"]
+
+
+def test_index_readd_replaces_digest(index):
+    first, second = data(65536), data(300000)
+    index.add("/case/file.bin", fuzzy_hash(first))
+    index.add("/case/file.bin", fuzzy_hash(second))
+    assert len(index) == 1
+    assert index.search(fuzzy_hash(first)) == []
+    assert [match["score"] for match in index.search(fuzzy_hash(second))] == [100]
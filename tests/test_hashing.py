@@ -0,0 +1,30 @@
+import hashlib
+
+from handlers.hashing import calculate_entropy, calculate_forensic_hashes
+
+
+def test_hashes_from_one_read(tmp_path):
+    data = bytes(range(256)) * 20
+    path = tmp_path / "sample.bin"
+    path.write_bytes(data)
+    hashes = calculate_forensic_hashes(str(path), fuzzy=True)
+    assert hashes["sha256"] == hashlib.sha256(data).hexdigest()
+    assert hashes["blake2b"] == hashlib.blake2b(data).hexdigest()
+    assert hashes["head_1k_md5"] == hashlib.md5(data[:1024]).hexdigest()
+    assert hashes["tail_1k_sha1"] == hashlib.sha1(data[-1024:]).hexdigest()
+    assert hashes["ssdeep"].startswith("96:")
+
+
+def test_fuzzy_hash_is_opt_in_without_the_extension(tmp_path, monkeypatch):
+    from handlers import hashing
+    monkeypatch.setattr(hashing, "NATIVE", False)
+    path = tmp_path / "sample.bin"
+    path.write_bytes(b"x" * 100)
+    assert "ssdeep" not in calculate_forensic_hashes(str(path))
+
+
+def test_entropy():
+    assert calculate_entropy(b"") == 0.0
+    assert calculate_entropy(b"a" * 100) == 0.0
+    assert calculate_entropy(b"ab" * 50) == 1.0
+    assert calculate_entropy(bytes(range(256))) == 8.0
@@ -0,0 +1,37 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from handlers.image_forensics import analyze_tampering  # noqa: E402
+
+
+@pytest.fixture
+def photo(tmp_path):
+    rng = np.random.default_rng(7)
+    pixels = (rng.random((600, 1100, 3)) * 255).astype("uint8")
+    path = tmp_path / "photo.jpg"
+    Image.fromarray(pixels).save(path, quality=85)
+    return path
+
+
+def test_grid_covers_the_image(photo):
+    result = analyze_tampering(str(photo), tile_size=256)
+    assert (result["width"], result["height"]) == (1100, 600)
+    assert result["grid"] == {"rows": 3, "cols": 5}
+    assert len(result["ela"]) == 3 and all(len(row) == 5 for row in result["ela"])
+    assert 0.0 <= result["summary"]["score"] <= 1.0
+
+
+def test_other_modes_match_a_converted_copy(photo, tmp_path):
+    cmyk = tmp_path / "photo_cmyk.jpg"
+    Image.open(photo).convert("CMYK").save(cmyk, quality=85)
+    converted = tmp_path / "photo_rgb.png"
+    Image.open(cmyk).convert("RGB").save(converted)
+    tiled, whole = analyze_tampering(str(cmyk)), analyze_tampering(str(converted))
+    assert tiled["ela"] == whole["ela"]
+    assert tiled["noise"] == whole["noise"]
+
+
+def test_worker_count_does_not_change_scores(photo):
+    assert analyze_tampering(str(photo), workers=1)["ela"] == analyze_tampering(str(photo))["ela"]
@@ -0,0 +1,81 @@
+import hashlib
+import importlib
+import os
+
+import pytest
+
+from handlers import known_hashes
+from handlers.known_hashes import STATUS_KNOWN, STATUS_NOTABLE, KnownHashIndex, build_index, known_file_verdict
+
+
+def sha1(i):
+    return hashlib.sha1(f"file {i}".encode()).hexdigest()
+
+
+@pytest.fixture
+def lists(tmp_path):
+    good = tmp_path / "NSRLFile.txt"
+    good.write_text('"SHA-1","MD5","FileName"\n' + "".join(f'"{sha1(i).upper()}","{"0" * 32}","f{i}"\n'
+                                                          for i in range(5000)))
+    bad = tmp_path / "notable.txt"
+    bad.write_text(f"{sha1(7)}  dropper.exe\n{sha1(9000)}  implant.dll\nnot a hash\n")
+    return str(good), str(bad)
+
+
+@pytest.fixture
+def index(lists, tmp_path, monkeypatch):
+    # Small runs so the import exercises the on-disk merge
+    monkeypatch.setattr(known_hashes, "RUN_ENTRIES", 700)
+    good, bad = lists
+    path = str(tmp_path / "case.kh")
+    assert build_index(path, [(good, STATUS_KNOWN), (bad, STATUS_NOTABLE)]) == 5001
+    index = KnownHashIndex(path)
+    yield index
+    index.close()
+
+
+def test_lookup(index):
+    assert index.algorithm == "sha1"
+    assert len(index) == 5001
+    assert index.lookup(sha1(0)) == "known"
+    assert index.lookup(sha1(4999).upper()) == "known"
+    assert index.lookup(sha1(9000)) == "notable"
+    assert index.lookup(sha1(5000)) is None
+    assert index.lookup("zz") is None
+    assert index.lookup(hashlib.md5(b"x").hexdigest()) is None
+
+
+def test_listed_as_both_is_notable(index):
+    assert index.lookup(sha1(7)) == "notable"
+
+
+def test_bloom_filter_has_no_false_negatives(index):
+    for i in list(range(5000)) + [9000]:
+        assert index._maybe_contains(bytes.fromhex(sha1(i)))
+
+
+def test_bloom_filter_rejects_most_unknown_digests(index):
+    false_positives = sum(index._maybe_contains(bytes.fromhex(sha1(i))) for i in range(10000, 20000))
+    assert false_positives < 10000 * known_hashes.BLOOM_FALSE_POSITIVE_RATE * 3
+
+
+def test_verdict_prefers_notable(index, tmp_path):
+    good = tmp_path / "good.txt"
+    good.write_text(sha1(9000) + "\n")
+    second = str(tmp_path / "good.kh")
+    build_index(second, [(str(good), STATUS_KNOWN)])
+    indexes = [second, index.path]
+    assert known_file_verdict({"sha1": sha1(9000)}, indexes) == {
+        "status": "notable", "algorithm": "sha1", "index": "case.kh"
+    }
+    assert known_file_verdict({"sha1": sha1(1)}, indexes)["status"] == "known"
+    assert known_file_verdict({"sha1": sha1(5000)}, indexes) == {"status": "unknown"}
+
+
+def test_preload_maps_indexes_from_the_environment(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(known_hashes, "_open_indexes", {})
+    missing = str(tmp_path / "missing.kh")
+    monkeypatch.setenv(known_hashes.INDEXES_ENV, os.pathsep.join([index.path, missing]))
+    from handlers import index_preload
+    importlib.reload(index_preload)
+    assert list(known_hashes._open_indexes) == [index.path]
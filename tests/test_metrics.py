@@ -0,0 +1,82 @@
+import json
+import threading
+
+import pytest
+
+from handlers import metrics
+from handlers.analyze import analyze_file
+
+CLEAN_PDF = b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\nstartxref\n9\n%%EOF\n"
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrics.reset()
+    metrics.enable(json_path=str(tmp_path / "metrics.json"), prom_path=str(tmp_path / "imazer.prom"))
+    yield tmp_path
+    monkeypatch.setattr(metrics, "_enabled", False)
+    monkeypatch.setattr(metrics, "_config", {})
+    metrics.reset()
+
+
+def counter(summary, name, **labels):
+    return sum(entry["value"] for entry in summary["counters"]
+               if entry["name"] == name and all(entry["labels"].get(k) == v for k, v in labels.items()))
+
+
+def test_disabled_instrumentation_records_nothing():
+    assert not metrics.enabled()
+    with metrics.span("pdf"):
+        metrics.count("files", kind="pdf")
+    assert metrics.summary()["counters"] == []
+
+
+def test_worker_metrics_are_merged(registry):
+    pdf = registry / "clean.pdf"
+    pdf.write_bytes(CLEAN_PDF)
+    result = analyze_file(str(pdf), pdf_triage=True)
+    assert "skipped" in result
+    summary = metrics.summary()
+    assert counter(summary, "files", kind="pdf") == 1
+    assert counter(summary, "files_triaged_out", kind="pdf") == 1
+    assert summary["stages"]["pdf.structure"]["count"] == 1
+    assert summary["stages"]["budget.pdf"]["count"] == 1
+
+
+def test_killed_workers_are_still_counted_and_timed(registry):
+    pdf = registry / "slow.pdf"
+    pdf.write_bytes(CLEAN_PDF)
+    result = analyze_file(str(pdf), pdf_triage=True, timeout=1e-6)
+    assert result["budget_error"]["type"] == "timeout"
+    summary = metrics.summary()
+    assert counter(summary, "files", kind="pdf") == 1
+    assert counter(summary, "budget_errors", type="timeout", kind="pdf") == 1
+    assert summary["stages"]["budget.pdf"]["count"] == 1
+
+
+def test_merge_adds_up_worker_registries(registry):
+    metrics.observe("stage", "hashes", 0.2)
+    metrics.count("bytes_read", 10, stage="hashes")
+    worker = {
+        "histograms": [["stage", "hashes", [1, 0.4, 0.4] + [0] * 7 + [1] + [0] * 5]],
+        "counters": [["bytes_read", [["stage", "hashes"]], 5]],
+        "samples": [],
+    }
+    metrics.merge(worker)
+    summary = metrics.summary()
+    assert summary["stages"]["hashes"]["count"] == 2
+    assert summary["stages"]["hashes"]["max_ms"] == 400.0
+    assert counter(summary, "bytes_read", stage="hashes") == 15
+
+
+def test_concurrent_exports_stay_valid(registry):
+    metrics.count("files", kind="pdf")
+    threads = [threading.Thread(target=metrics.export) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter(json.loads((registry / "metrics.json").read_text()), "files") == 1
+    assert 'imazer_files_total{kind="pdf"} 1' in (registry / "imazer.prom").read_text()
+    assert not list(registry.glob("*.tmp"))
@@ -0,0 +1,80 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from handlers.output import NDJSONWriter, encode_record
+
+
+def read_lines(path, opener=open):
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_encode_record_is_one_compact_line():
+    line = encode_record({"file": "a.pdf", "big": 2 ** 70, "nested": {"k": [1, 2]}})
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert json.loads(line)["big"] == 2 ** 70
+
+
+def test_appends_to_an_unrotated_file(tmp_path):
+    path = tmp_path / "results.ndjson"
+    for run in range(2):
+        with NDJSONWriter(str(path)) as writer:
+            writer.write({"run": run})
+    assert read_lines(path) == [{"run": 0}, {"run": 1}]
+
+
+def test_rotation_splits_at_the_threshold(tmp_path):
+    record = {"file": "x" * 80}
+    size = len(encode_record(record))
+    with NDJSONWriter(str(tmp_path / "results.ndjson"), rotate_bytes=size * 3) as writer:
+        for _ in range(7):
+            writer.write(record)
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ["results.00000.ndjson", "results.00001.ndjson", "results.00002.ndjson"]
+    assert [len(read_lines(tmp_path / name)) for name in names] == [3, 3, 1]
+
+
+def test_oversized_record_gets_its_own_file(tmp_path):
+    with NDJSONWriter(str(tmp_path / "out"), rotate_bytes=10) as writer:
+        writer.write({"file": "longer than ten bytes"})
+        writer.write({"file": "another long record"})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.00000.ndjson", "out.00001.ndjson"]
+
+
+def test_later_runs_continue_the_numbering(tmp_path):
+    path = str(tmp_path / "results.ndjson")
+    (tmp_path / "results.00007.ndjson.bak").write_text("not ours")
+    (tmp_path / "other.00009.ndjson").write_text("not ours either")
+    for run in range(2):
+        with NDJSONWriter(path, rotate_bytes=1) as writer:
+            writer.write({"run": run, "record": 0})
+            writer.write({"run": run, "record": 1})
+    assert [read_lines(tmp_path / f"results.{i:05d}.ndjson") for i in range(4)] == [
+        [{"run": 0, "record": 0}], [{"run": 0, "record": 1}],
+        [{"run": 1, "record": 0}], [{"run": 1, "record": 1}],
+    ]
+
+
+def test_gzip_rotation_is_readable_while_open(tmp_path):
+    path = str(tmp_path / "results.ndjson.gz")
+    with NDJSONWriter(path, compression="gzip", rotate_bytes=1000) as writer:
+        writer.write({"n": 1})
+        # The sync flush makes every written record decodable before close
+        partial = (tmp_path / "results.ndjson.00000.gz").read_bytes()
+        assert json.loads(zlib.decompressobj(31).decompress(partial)) == {"n": 1}
+    with NDJSONWriter(path, compression="gzip", rotate_bytes=1000) as writer:
+        writer.write({"n": 2})
+    assert read_lines(tmp_path / "results.ndjson.00000.gz", gzip.open) == [{"n": 1}]
+    assert read_lines(tmp_path / "results.ndjson.00001.gz", gzip.open) == [{"n": 2}]
+
+
+def test_stdout_cannot_rotate_or_compress():
+    with pytest.raises(ValueError):
+        NDJSONWriter("-", rotate_bytes=100)
+    with pytest.raises(ValueError):
+        NDJSONWriter("-", compression="gzip")
+    with pytest.raises(ValueError):
+        NDJSONWriter("out.ndjson", compression="bz2")
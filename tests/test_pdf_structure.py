@@ -0,0 +1,150 @@
+import zlib
+
+import pytest
+
+from handlers import pdf_structure
+from handlers.pdf_structure import scan_pdf_structure
+
+BODY = (
+    b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+    b"2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n"
+    b"3 0 obj\n<< /Type /Page /Parent 2 0 R >>\nendobj\n"
+)
+XREF = b"xref\n0 4\n0000000000 65535 f \ntrailer\n<< /Size 4 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+
+
+def pdf(body=BODY, updates=(), head=b""):
+    data = b"%PDF-1.7\n" + head + body
+    data += XREF % len(data)
+    for update in updates:
+        data += update
+        data += XREF % len(data)
+    return data
+
+
+@pytest.fixture
+def scan(tmp_path):
+    def scan(data, **kwargs):
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(data)
+        return scan_pdf_structure(str(path), **kwargs)
+    return scan
+
+
+def test_clean_file_needs_no_full_analysis(scan):
+    structure = scan(pdf())
+    assert structure["objects"] == 3
+    assert structure["pages"] == 1
+    assert structure["incremental_updates"] == 0
+    assert structure["linearized"] is False
+    assert structure["flags"] == []
+    assert structure["needs_full_analysis"] is False
+
+
+def test_incremental_update_is_flagged(scan):
+    structure = scan(pdf(updates=[b"3 0 obj\n<< /Type /Page /Parent 2 0 R /Rotate 90 >>\nendobj\n"]))
+    assert structure["incremental_updates"] == 1
+    assert structure["eof_markers"] == 2
+    assert "incremental_updates" in structure["flags"]
+
+
+LINEARIZATION = b"4 0 obj\n<< /Linearized 1 /L 1000 /H [0 0] /O 3 /E 0 /N 1 /T 0 >>\nendobj\n"
+FIRST_PAGE_SECTION = b"xref\n4 1\n0000000009 00000 n \ntrailer\n<< /Size 5 >>\nstartxref\n0\n%%EOF\n"
+
+
+def test_linearized_file_is_not_an_update(scan):
+    structure = scan(pdf(head=LINEARIZATION + FIRST_PAGE_SECTION))
+    assert structure["linearized"] is True
+    assert structure["eof_markers"] == 2
+    assert structure["incremental_updates"] == 0
+    assert "incremental_updates" not in structure["flags"]
+
+
+def test_linearized_file_with_a_real_update(scan):
+    structure = scan(pdf(head=LINEARIZATION + FIRST_PAGE_SECTION, updates=[b"5 0 obj\n<< >>\nendobj\n"]))
+    assert structure["incremental_updates"] == 1
+
+
+def test_linearized_must_be_the_first_object(scan):
+    late = b"5 0 obj\n<< /Linearized 1 >>\nendobj\n"
+    assert scan(pdf(body=BODY + late))["linearized"] is False
+
+
+def test_action_names_raise_flags(scan):
+    body = BODY + b"4 0 obj\n<< /S /JavaScript /JS (app.alert(1)) >>\nendobj\n"
+    body += b"5 0 obj\n<< /OpenAction 4 0 R /Launch << >> >>\nendobj\n"
+    structure = scan(pdf(body=body))
+    assert structure["names"]["/JavaScript"] == 1
+    assert structure["names"]["/JS"] == 1
+    assert {"javascript", "auto_action", "launch"} <= set(structure["flags"])
+    assert structure["needs_full_analysis"] is True
+
+
+def test_longer_names_are_not_counted_as_tracked_ones(scan):
+    body = BODY + b"4 0 obj\n<< /JSON 1 /AAX 2 /Pagesize 3 >>\nendobj\n"
+    structure = scan(pdf(body=body))
+    assert structure["names"]["/JS"] == 0
+    assert structure["names"]["/AA"] == 0
+    assert structure["flags"] == []
+
+
+def test_escaped_names_are_decoded(scan):
+    body = BODY + b"4 0 obj\n<< /S /J#61vaScript /#4Apen 1 /Open#41ction 3 0 R >>\nendobj\n"
+    structure = scan(pdf(body=body))
+    assert structure["names"]["/JavaScript"] == 1
+    assert structure["names"]["/OpenAction"] == 1
+    assert structure["obfuscated_names"] == ["/JavaScript", "/OpenAction"]
+    assert {"javascript", "auto_action", "obfuscated_names"} <= set(structure["flags"])
+
+
+def object_stream(payload, filters=b"/Filter /FlateDecode"):
+    data = zlib.compress(payload) if b"FlateDecode" in filters else payload
+    return (
+        b"6 0 obj\n<< /Type /ObjStm /N 2 /First 8 %s /Length %d >>\nstream\n" % (filters, len(data))
+        + data + b"\nendstream\nendobj\n"
+    )
+
+
+def test_object_streams_are_inflated(scan):
+    payload = b"4 0 5 30 << /S /JavaScript /JS (x) >> << /Type /EmbeddedF#69le >>"
+    structure = scan(pdf(body=BODY + object_stream(payload)))
+    assert structure["object_streams"]["count"] == 1
+    assert structure["object_streams"]["compressed_objects"] == 2
+    assert structure["object_streams"]["inflated_bytes"] == len(payload)
+    assert structure["names"]["/JavaScript"] == 1
+    assert structure["names"]["/EmbeddedFile"] == 1
+    assert "/EmbeddedFile" in structure["obfuscated_names"]
+    assert "uninspected_object_streams" not in structure["flags"]
+
+
+def test_object_streams_that_cannot_be_read_are_flagged(scan):
+    payload = b"4 0 << /S /JavaScript >>"
+    structure = scan(pdf(body=BODY + object_stream(payload, b"/Filter /LZWDecode")))
+    assert structure["object_streams"]["uninspected"] == 1
+    assert "uninspected_object_streams" in structure["flags"]
+    assert "uninspected_object_streams" in scan(
+        pdf(body=BODY + object_stream(payload)), inflate_object_streams=False
+    )["flags"]
+
+
+def test_inflation_is_capped(scan, monkeypatch):
+    monkeypatch.setattr(pdf_structure, "MAX_INFLATED_BYTES", 100)
+    structure = scan(pdf(body=BODY + object_stream(b"4 0 " + b" " * 500 + b"/JavaScript")))
+    assert structure["object_streams"]["inflated_bytes"] <= 100
+
+
+def test_header_offset_and_trailing_data(scan):
+    structure = scan(b"junk" + pdf() + b"X" * 200)
+    assert structure["header_offset"] == 4
+    assert structure["trailing_bytes"] == 200
+    assert {"header_offset", "trailing_data"} <= set(structure["flags"])
+    assert "no_pdf_header" in scan(b"not a pdf at all")["flags"]
+
+
+def test_markers_across_window_boundaries(scan, monkeypatch):
+    monkeypatch.setattr(pdf_structure, "WINDOW", 64)
+    monkeypatch.setattr(pdf_structure, "SPLIT_SEARCH", 64)
+    body = BODY + b"".join(b"%d 0 obj\n<< /JS (x) >>\nendobj\n" % n for n in range(4, 40))
+    structure = scan(pdf(body=body))
+    assert structure["objects"] == 39
+    assert structure["names"]["/JS"] == 36
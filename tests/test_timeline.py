@@ -0,0 +1,127 @@
+import zlib
+
+import pytest
+
+from handlers.pdf_structure import scan_pdf_structure
+from handlers.timeline import extract_events, format_utc, parse_exif_date, parse_pdf_date, parse_timestamp
+
+
+def utc(parsed):
+    return format_utc(parsed[0]), parsed[1]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("D:20230615123000+02'00'", ("2023-06-15T10:30:00.000000Z", False)),
+    ("D:20230615123000-05'30'", ("2023-06-15T18:00:00.000000Z", False)),
+    ("D:20230615123000+02'00", ("2023-06-15T10:30:00.000000Z", False)),
+    ("D:20230615123000+02", ("2023-06-15T10:30:00.000000Z", False)),
+    ("D:20230615123000Z", ("2023-06-15T12:30:00.000000Z", False)),
+    ("D:20230615123000Z00'00'", ("2023-06-15T12:30:00.000000Z", False)),
+    ("D:20230615123000", ("2023-06-15T12:30:00.000000Z", True)),
+    ("20230615123000+01'00'", ("2023-06-15T11:30:00.000000Z", False)),
+    ("D:2023", ("2023-01-01T00:00:00.000000Z", True)),
+])
+def test_pdf_dates(value, expected):
+    assert utc(parse_pdf_date(value)) == expected
+    assert utc(parse_timestamp(value)) == expected
+
+
+@pytest.mark.parametrize("value, offset, expected", [
+    ("2023:06:15 12:30:00", None, ("2023-06-15T12:30:00.000000Z", True)),
+    ("2023:06:15 12:30:00", "+02:00", ("2023-06-15T10:30:00.000000Z", False)),
+    ("2023:06:15 12:30:00", "-0330", ("2023-06-15T16:00:00.000000Z", False)),
+    ("2023:06:15 12:30:00", "   ", ("2023-06-15T12:30:00.000000Z", True)),
+    ("2023:06:15 12:30:00.25+01:00", None, ("2023-06-15T11:30:00.250000Z", False)),
+    ("2023:06:15 12:30:00.123456Z", "+05:00", ("2023-06-15T12:30:00.123456Z", False)),
+])
+def test_exif_dates(value, offset, expected):
+    assert utc(parse_exif_date(value, offset)) == expected
+    assert utc(parse_timestamp(value, offset)) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2023-06-15T12:30:00Z", ("2023-06-15T12:30:00.000000Z", False)),
+    ("2023-06-15T12:30:00.5+02:00", ("2023-06-15T10:30:00.500000Z", False)),
+    ("UTC 2023-06-15 12:30:00", ("2023-06-15T12:30:00.000000Z", False)),
+    ("2023-06-15", ("2023-06-15T00:00:00.000000Z", True)),
+    (1686832200, ("2023-06-15T12:30:00.000000Z", False)),
+    (1686832200.25, ("2023-06-15T12:30:00.250000Z", False)),
+])
+def test_iso_dates_and_epochs(value, expected):
+    assert utc(parse_timestamp(value)) == expected
+
+
+@pytest.mark.parametrize("value", [
+    None, True, "", "   ", "garbage", b"\xff\xfe",
+    "0000:00:00 00:00:00",
+    "2023:13:45 12:30:00",
+    "2023:06:15 25:61:00",
+    "2023:06:15 12:30:00", "D:20231345000000", "D:", "D:abc",
+    "2023-06-15T12:30:00+2",
+    "D:99999999999999",
+])
+def test_malformed_dates(value):
+    offset = "not an offset" if value == "2023:06:15 12:30:00" else None
+    assert parse_timestamp(value, offset) is None
+
+
+def write_pdf(path, body):
+    path.write_bytes(b"%PDF-1.5\n" + body + b"\nstartxref\n9\n%%EOF\n")
+    return str(path)
+
+
+def test_structural_scan_reads_info_dates(tmp_path):
+    path = write_pdf(tmp_path / "plain.pdf", (
+        b"1 0 obj\n<< /Producer (x) /CreationDate (D:20230615123000+02'00') >>\nendobj\n"
+        b"2 0 obj\n<< /ModDate <FEFF0044003A00320030003200330030003700300031> >>\nendobj"
+    ))
+    assert scan_pdf_structure(path)["info_dates"] == {
+        "CreationDate": "D:20230615123000+02'00'",
+        "ModDate": "D:20230701",
+    }
+
+
+def test_structural_scan_reads_info_dates_in_object_streams(tmp_path):
+    packed = zlib.compress(b"5 0 << /CreationDate (D:20200101000000Z) >>")
+    path = write_pdf(tmp_path / "objstm.pdf", (
+        b"1 0 obj\n<< /Type /ObjStm /N 1 /First 4 /Filter /FlateDecode /Length %d >>\nstream\n" % len(packed)
+        + packed + b"\nendstream\nendobj"
+    ))
+    assert scan_pdf_structure(path)["info_dates"] == {"CreationDate": "D:20200101000000Z"}
+
+
+def test_last_revision_wins_and_indirect_dates_are_skipped(tmp_path):
+    path = write_pdf(tmp_path / "updated.pdf", (
+        b"1 0 obj\n<< /CreationDate (D:2020) /ModDate (D:2021) >>\nendobj\n"
+        b"1 0 obj\n<< /CreationDate (D:2020) /ModDate (D:2022) >>\nendobj\n"
+        b"2 0 obj\n<< /CreationDate 7 0 R >>\nendobj"
+    ))
+    assert scan_pdf_structure(path)["info_dates"] == {"ModDate": "D:2022"}
+
+
+def test_triaged_pdf_keeps_its_dates(tmp_path):
+    path = write_pdf(tmp_path / "triaged.pdf", b"1 0 obj\n<< /CreationDate (D:20230615123000Z) >>\nendobj")
+    result = {"file_path": path, "structure": scan_pdf_structure(path), "skipped": "No structural flags"}
+    events = [event for event in extract_events(path, "pdf", result) if event["artifact"] == "pdf_info"]
+    assert [(event["field"], event["utc"]) for event in events] == [
+        ("CreationDate", "2023-06-15T12:30:00.000000Z")
+    ]
+
+
+def test_pdfminer_metadata_wins_over_the_raw_scan(tmp_path):
+    path = write_pdf(tmp_path / "full.pdf", b"1 0 obj\n<< /CreationDate (D:2020) /ModDate (D:2021) >>\nendobj")
+    result = {
+        "metadata": {"CreationDate": "D:20230615123000Z"},
+        "structure": scan_pdf_structure(path),
+    }
+    events = {event["field"]: event["utc"] for event in extract_events(path, "pdf", result)
+              if event["artifact"] == "pdf_info"}
+    assert events == {"CreationDate": "2023-06-15T12:30:00.000000Z", "ModDate": "2021-01-01T00:00:00.000000Z"}
+
+
+def test_filesystem_times_come_from_the_given_stat(tmp_path):
+    class Stat:
+        st_mtime, st_atime, st_ctime = 1686832200, 1686832201, 1686832202
+
+    events = extract_events(str(tmp_path / "gone.pdf"), "pdf", {}, stat=Stat)
+    assert [event["field"] for event in events] == ["mtime", "atime", "ctime"]